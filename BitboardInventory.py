@@ -0,0 +1,210 @@
+COLORS = ['red', 'green', 'blue', 'yellow']
+INITIAL_SIZE = 9  # Cells per side of a new board, the center card sits in the middle
+
+
+class BitboardInventory:
+    # Inventory with the same methods as Inventory, backed by an array of cells and one occupancy bitboard per color
+    # Cell (x, y) is bit (y - origin_y) * stride + (x - origin_x), every row ends with an always empty guard column
+    # so shifting by 1 never moves a card into the next row. The board grows when a card gets next to its edge.
+    def __init__(self):
+        self.center_x = 0
+        self.center_y = 0
+        self.bounds = None  # (min_x, max_x, min_y, max_y) of the placed cards
+        self.placement_history = []  # Bounds before each placement, used by remove_card
+        self._allocate(self.center_x - INITIAL_SIZE // 2, self.center_y - INITIAL_SIZE // 2, INITIAL_SIZE, INITIAL_SIZE)
+
+    def _allocate(self, origin_x, origin_y, width, height):
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.width = width
+        self.height = height
+        self.stride = width + 1  # One guard column per row
+        self.cells = [None] * (self.stride * height)
+        self.color_boards = {color: 0 for color in COLORS}
+        self.occupied = 0
+        row_mask = (1 << width) - 1
+        self.valid_mask = 0  # Every cell of the board, guard columns left out
+        for row in range(height):
+            self.valid_mask |= row_mask << (row * self.stride)
+
+    def _grow(self, x, y):
+        # Rebuild the board so (x, y) and its neighbours fit, with room to spare on every side
+        cards = self.get_all_cards()
+        min_x, max_x, min_y, max_y = x, x, y, y
+        for _, card_x, card_y in cards:
+            min_x, max_x = min(min_x, card_x), max(max_x, card_x)
+            min_y, max_y = min(min_y, card_y), max(max_y, card_y)
+        width = max(self.width * 2, max_x - min_x + 3)
+        height = max(self.height * 2, max_y - min_y + 3)
+        origin_x = (min_x + max_x) // 2 - width // 2
+        origin_y = (min_y + max_y) // 2 - height // 2
+        self._allocate(origin_x, origin_y, width, height)
+        for card, card_x, card_y in cards:
+            self._set_cell(card, self._index(card_x, card_y))
+
+    def _index(self, x, y):
+        # Bit index of (x, y), None when it is off the board
+        column = x - self.origin_x
+        row = y - self.origin_y
+        if 0 <= column < self.width and 0 <= row < self.height:
+            return row * self.stride + column
+        return None
+
+    def _position(self, index):
+        row, column = divmod(index, self.stride)
+        return column + self.origin_x, row + self.origin_y
+
+    def _positions(self, board):
+        # Positions of the set bits of a bitboard
+        positions = []
+        while board:
+            lowest_bit = board & -board
+            positions.append(self._position(lowest_bit.bit_length() - 1))
+            board ^= lowest_bit
+        return positions
+
+    def _set_cell(self, card, index):
+        bit = 1 << index
+        self.cells[index] = card
+        self.color_boards[card.color] = self.color_boards.get(card.color, 0) | bit
+        self.occupied |= bit
+
+    def _dilate(self, board):
+        # The board and every cell next to it
+        stride = self.stride
+        return (board | board << 1 | board >> 1 | board << stride | board >> stride) & self.valid_mask
+
+    def _flood(self, seed, board):
+        # The connected part of board that contains the seed bits
+        region = seed
+        while True:
+            grown = self._dilate(region) & board
+            if grown == region:
+                return region
+            region = grown
+
+    def _neighbor_bits(self, x, y):
+        bits = 0
+        for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
+            index = self._index(x + dx, y + dy)
+            if index is not None:
+                bits |= 1 << index
+        return bits
+
+    def add_card(self, card, x, y):
+        # Keep a free ring around the cards so every placement cell is on the board
+        if not (self.origin_x < x < self.origin_x + self.width - 1 and self.origin_y < y < self.origin_y + self.height - 1):
+            self._grow(x, y)
+        self._set_cell(card, self._index(x, y))
+
+        old_bounds = self.bounds
+        if old_bounds is None:
+            self.bounds = (x, x, y, y)
+        else:
+            min_x, max_x, min_y, max_y = old_bounds
+            self.bounds = (min(min_x, x), max(max_x, x), min(min_y, y), max(max_y, y))
+        self.placement_history.append(old_bounds)
+
+    def remove_card(self, x, y):
+        # Used to take back a placement (AI search), returns the removed card
+        # Only the most recently added card can be removed, like Inventory.remove_card
+        index = self._index(x, y)
+        card = self.cells[index]
+        bit = 1 << index
+        self.cells[index] = None
+        self.color_boards[card.color] &= ~bit
+        self.occupied &= ~bit
+        self.bounds = self.placement_history.pop()
+        return card
+
+    @property
+    def grid(self):
+        # Position -> card, built on request for the code that reads the inventory as a dict
+        return {(x, y): card for card, x, y in self.get_all_cards()}
+
+    def get_card(self, x, y):
+        index = self._index(x, y)
+        if index is None:
+            return None
+        return self.cells[index]
+
+    def get_all_cards(self):
+        return [(self.cells[self._index(x, y)], x, y) for x, y in self._positions(self.occupied)]
+
+    def find_region(self, x, y):
+        # Returns a representative position of the region of the card at (x, y): its lowest bit
+        region = self._flood(1 << self._index(x, y), self.color_boards[self.get_card(x, y).color])
+        return self._position((region & -region).bit_length() - 1)
+
+    def get_region_size(self, x, y):
+        # Number of cards in the same-colored region of the card at (x, y)
+        return self._flood(1 << self._index(x, y), self.color_boards[self.get_card(x, y).color]).bit_count()
+
+    def get_adjacent_region_size(self, x, y, color):
+        # Size of the regions of the given color next to (x, y), not counting (x, y) itself
+        # Every neighbour adds the size of its own region, as the token checks always counted it
+        board = self.color_boards.get(color, 0)
+        index = self._index(x, y)
+        if index is None:
+            neighbors = self._neighbor_bits(x, y) & board
+        else:
+            bit = 1 << index
+            board &= ~bit
+            neighbors = self._dilate(bit) & board
+        if not neighbors:
+            return 0
+        total = 0
+        while neighbors:
+            region = self._flood(neighbors & -neighbors, board)
+            # Neighbours in the same region count it once each
+            total += region.bit_count() * (neighbors & region).bit_count()
+            neighbors &= ~region
+        return total
+
+    def get_affected_positions(self, x, y):
+        # Cards whose color counts changed when the card at (x, y) was placed:
+        # only its own color's regions changed, so its region and the cards bordering that region
+        region = self._flood(1 << self._index(x, y), self.color_boards[self.get_card(x, y).color])
+        border = self._dilate(region) & self.occupied & ~region
+        return self._positions(region) + self._positions(border)
+
+    def get_largest_regions(self):
+        # Size of the largest region of each color
+        largest = {color: 0 for color in COLORS}
+        for color in COLORS:
+            board = self.color_boards[color]
+            while board:
+                region = self._flood(board & -board, board)
+                largest[color] = max(largest[color], region.bit_count())
+                board &= ~region
+        return largest
+
+    def get_inventory_bounds(self):
+        if self.bounds is None:
+            return 0, 0, 0, 0
+        return self.bounds
+
+    def get_frontier(self):
+        # Bitboard of the empty cells next to a card
+        return self._dilate(self.occupied) & ~self.occupied
+
+    def is_valid_placement(self, x, y):
+        # A card can go next to another card, the first card goes to the center
+        if not self.occupied:
+            return (x, y) == (self.center_x, self.center_y)
+        index = self._index(x, y)
+        return index is not None and bool(self.get_frontier() >> index & 1)
+
+    def get_placement_cells(self):
+        # Every position where the next card can be placed, ordered by x then y
+        if not self.occupied:
+            return [(self.center_x, self.center_y)]
+        return sorted(self._positions(self.get_frontier()))
+
+    def copy(self):
+        new_inventory = BitboardInventory.__new__(BitboardInventory)
+        new_inventory.__dict__.update(self.__dict__)
+        new_inventory.cells = self.cells[:]
+        new_inventory.color_boards = self.color_boards.copy()
+        new_inventory.placement_history = self.placement_history[:]
+        return new_inventory
@@ -1,17 +1,45 @@
-from Token import Token
+from Token import COLORS
+
+
+def _catalog_card(card_id):
+    from card_generator import CARD_CATALOG
+    return CARD_CATALOG[card_id]
+
+
+MAX_TOKENS = 3
 
 class Card:
     # A card has a maximum of 3 tokens, has color, and has a movement cost
+    # Cards are immutable, every game deals the same instances from card_generator.CARD_CATALOG
+    __slots__ = ('color', 'movement', 'tokens', 'card_id', 'token_colors')
 
-    def __init__(self, color, movement, tokens):
+    def __init__(self, color, movement, tokens, card_id=None):
         # Card constructor
-        self.color = color
-        self.movement = movement
-        self.tokens = tokens[:3]  # Maximum 3 tokens
+        object.__setattr__(self, 'color', color)
+        object.__setattr__(self, 'movement', movement)
+        object.__setattr__(self, 'tokens', tuple(tokens[:MAX_TOKENS]))  # Maximum 3 tokens
+        object.__setattr__(self, 'card_id', card_id)  # Index of the card in CARD_DATA
+        # Colors asked for by at least one of the tokens, the only counts the token checks need
+        object.__setattr__(self, 'token_colors', tuple(
+            color for color_index, color in enumerate(COLORS)
+            if any(token.requirements[color_index] for token in self.tokens)
+        ))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Card is immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # Copying a game shares its cards
+        return self
 
-    def is_complete(self):
-        # Checks if all tokens are completed
-        return all(token.is_completed for token in self.tokens)
+    def __reduce__(self):
+        if self.card_id is None:
+            return Card, (self.color, self.movement, self.tokens)
+        # Catalog cards are sent by their id and unpickle to the catalog instance of the receiving process
+        return _catalog_card, (self.card_id,)
 
     def __str__(self):
         return f"Card(color={self.color}, movement={self.movement}, tokens={self.tokens})"
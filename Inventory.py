@@ -2,40 +2,191 @@ import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)  # Default level is INFO
-logger = logging.getLogger(__name__)
+
+DIRECTIONS = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+
 class Inventory:
     # Player's have their own inventories, these inventories store cards
+    # Same-colored connected cards form regions, kept in a disjoint-set index updated on every placement
+    # The frontier of empty positions next to the cards and the bounds are kept up to date the same way
     def __init__(self):
         self.grid = {}
         self.center_x = 0
         self.center_y = 0
+        self.region_parent = {}  # Position -> parent position in its region's tree
+        self.region_size = {}  # Root position -> number of cards in the region
+        self.frontier = set()  # Empty positions next to a card, where the next card can be placed
+        self.bounds = None  # (min_x, max_x, min_y, max_y) of the placed cards
+        self.placement_history = []  # What each placement changed, used by remove_card
 
-    def add_card(self, card, x, y, player_name=None):
-        if player_name:
-            logger.info(f"{player_name} is adding card at ({x}, {y})")
-        else:
-            logger.info(f"Adding card at ({x}, {y})")
+    def add_card(self, card, x, y):
         self.grid[(x, y)] = card
 
+        # Join the new card with the regions of its same-colored neighbours (union by size)
+        position = (x, y)
+        self.region_parent[position] = position
+        self.region_size[position] = 1
+        merges = []
+        for dx, dy in DIRECTIONS:
+            neighbor_card = self.grid.get((x + dx, y + dy))
+            if neighbor_card is not None and neighbor_card.color == card.color:
+                root = self.find_region(x, y)
+                neighbor_root = self.find_region(x + dx, y + dy)
+                if root != neighbor_root:
+                    if self.region_size[root] < self.region_size[neighbor_root]:
+                        root, neighbor_root = neighbor_root, root
+                    self.region_parent[neighbor_root] = root
+                    self.region_size[root] += self.region_size[neighbor_root]
+                    merges.append((root, neighbor_root))
+
+        was_frontier = position in self.frontier
+        self.frontier.discard(position)
+        new_frontier = []
+        for dx, dy in DIRECTIONS:
+            neighbor = (x + dx, y + dy)
+            if neighbor not in self.grid and neighbor not in self.frontier:
+                self.frontier.add(neighbor)
+                new_frontier.append(neighbor)
+
+        old_bounds = self.bounds
+        if old_bounds is None:
+            self.bounds = (x, x, y, y)
+        else:
+            min_x, max_x, min_y, max_y = old_bounds
+            self.bounds = (min(min_x, x), max(max_x, x), min(min_y, y), max(max_y, y))
+
+        self.placement_history.append((merges, new_frontier, was_frontier, old_bounds))
+
+    def remove_card(self, x, y):
+        # Used to take back a placement (AI search), returns the removed card
+        # Only the most recently added card can be removed, its changes are rolled back in reverse
+        merges, new_frontier, was_frontier, old_bounds = self.placement_history.pop()
+        for root, neighbor_root in reversed(merges):
+            self.region_parent[neighbor_root] = neighbor_root
+            self.region_size[root] -= self.region_size[neighbor_root]
+        del self.region_parent[(x, y)]
+        del self.region_size[(x, y)]
+
+        self.frontier.difference_update(new_frontier)
+        if was_frontier:
+            self.frontier.add((x, y))
+        self.bounds = old_bounds
+        return self.grid.pop((x, y))
+
     def get_card(self, x, y):
         return self.grid.get((x, y), None)
 
     def get_all_cards(self):
         return [(card, x, y) for (x, y), card in self.grid.items()]
 
+    def find_region(self, x, y):
+        # Returns the root position of the region of the card at (x, y)
+        # No path compression, so merges can be rolled back by remove_card
+        position = (x, y)
+        parent = self.region_parent[position]
+        while parent != position:
+            position = parent
+            parent = self.region_parent[position]
+        return position
+
+    def get_region_size(self, x, y):
+        # Number of cards in the same-colored region of the card at (x, y)
+        return self.region_size[self.find_region(x, y)]
+
+    def get_adjacent_region_size(self, x, y, color):
+        # Size of the regions of the given color next to (x, y), not counting (x, y) itself
+        # Every neighbour adds the size of its own region, as the token checks always counted it
+        neighbors = []
+        for dx, dy in DIRECTIONS:
+            neighbor_card = self.grid.get((x + dx, y + dy))
+            if neighbor_card is not None and neighbor_card.color == color:
+                neighbors.append((x + dx, y + dy))
+        if not neighbors:
+            return 0
+
+        card = self.grid.get((x, y))
+        if card is None or card.color != color:
+            # (x, y) is not part of these regions
+            return sum(self.get_region_size(nx, ny) for nx, ny in neighbors)
+        if len(neighbors) == 1:
+            # With a single same-colored neighbour the rest of the region stays connected without (x, y)
+            return self.get_region_size(x, y) - 1
+
+        # (x, y) may be the only link between its neighbours, count the region with it left out
+        total = 0
+        sizes = {}
+        for neighbor in neighbors:
+            if neighbor not in sizes:
+                visited = self._collect_region(neighbor, color, (x, y))
+                for position in visited:
+                    sizes[position] = len(visited)
+            total += sizes[neighbor]
+        return total
+
+    def _collect_region(self, start, color, exclude_position):
+        visited = {start}
+        stack = [start]
+        while stack:
+            cx, cy = stack.pop()
+            for dx, dy in DIRECTIONS:
+                position = (cx + dx, cy + dy)
+                if position == exclude_position or position in visited:
+                    continue
+                neighbor_card = self.grid.get(position)
+                if neighbor_card is not None and neighbor_card.color == color:
+                    visited.add(position)
+                    stack.append(position)
+        return visited
+
+    def get_affected_positions(self, x, y):
+        # Cards whose color counts changed when the card at (x, y) was placed:
+        # only its own color's regions changed, so its region and the cards bordering that region
+        region = self._collect_region((x, y), self.grid[(x, y)].color, None)
+        affected = list(region)
+        border = set()
+        for cx, cy in region:
+            for dx, dy in DIRECTIONS:
+                position = (cx + dx, cy + dy)
+                if position in self.grid and position not in region and position not in border:
+                    border.add(position)
+                    affected.append(position)
+        return affected
+
+    def get_largest_regions(self):
+        # Size of the largest region of each color
+        largest = {color: 0 for color in ['red', 'green', 'blue', 'yellow']}
+        for position, parent in self.region_parent.items():
+            if position == parent:
+                color = self.grid[position].color
+                if color in largest:
+                    largest[color] = max(largest[color], self.region_size[position])
+        return largest
+
     def get_inventory_bounds(self):
-        if not self.grid:
+        if self.bounds is None:
             return 0, 0, 0, 0
-        min_x = min(x for x, y in self.grid.keys())
-        max_x = max(x for x, y in self.grid.keys())
-        min_y = min(y for x, y in self.grid.keys())
-        max_y = max(y for x, y in self.grid.keys())
-        return min_x, max_x, min_y, max_y
-    
+        return self.bounds
+
+    def is_valid_placement(self, x, y):
+        # A card can go next to another card, the first card goes to the center
+        if not self.grid:
+            return (x, y) == (self.center_x, self.center_y)
+        return (x, y) in self.frontier
+
+    def get_placement_cells(self):
+        # Every position where the next card can be placed, ordered by x then y
+        if not self.grid:
+            return [(self.center_x, self.center_y)]
+        return sorted(self.frontier)
+
     def copy(self):
         new_inventory = Inventory()
         new_inventory.grid = self.grid.copy()
         new_inventory.center_x = self.center_x
         new_inventory.center_y = self.center_y
+        new_inventory.region_parent = self.region_parent.copy()
+        new_inventory.region_size = self.region_size.copy()
+        new_inventory.frontier = self.frontier.copy()
+        new_inventory.bounds = self.bounds
+        new_inventory.placement_history = self.placement_history[:]
         return new_inventory
-
@@ -1,11 +1,15 @@
 from Inventory import Inventory
+from BitboardInventory import BitboardInventory
+
+# Inventory implementations a game can be created with, they share the same methods
+INVENTORY_ENGINES = {'dict': Inventory, 'bitboard': BitboardInventory}
 
 class Player:
     # Players can be either AI or human
-    def __init__(self, color, player_name, score=0, is_ai=False, ai_personality="Balanced"):
+    def __init__(self, color, player_name, score=0, is_ai=False, ai_personality="Balanced", search_depth=3, time_budget=None, max_nodes=None, inventory_engine='dict'):
         self.name = player_name
         self.color = color
-        self.inventory = Inventory()
+        self.inventory = INVENTORY_ENGINES[inventory_engine]()
         self.score = score
         self.total_movement = 0
         self.total_movement_at_turn_start = 0
@@ -13,6 +17,14 @@ class Player:
         self.token_progress_since_turn_start = 0
         self.is_ai = is_ai
         self.ai_personality = ai_personality  # Determines the variant of AI used
+        self.search_depth = search_depth  # Maximum depth of the AI search
+        self.time_budget = time_budget  # Seconds the AI may think per move, None for a fixed depth search
+        self.max_nodes = max_nodes  # Nodes the AI may search per move, None for no limit
+
+    def set_search_settings(self, search_depth=3, time_budget=None, max_nodes=None):
+        self.search_depth = search_depth
+        self.time_budget = time_budget
+        self.max_nodes = max_nodes
 
     def add_movement(self, movement):
         self.total_movement += movement
@@ -1,11 +1,69 @@
+import itertools
+
+COLORS = ('red', 'green', 'blue', 'yellow')
+MAX_COUNT = 4  # No token asks for more than 4 of a color, larger counts satisfy the same tokens
+
+# Every possible requirement vector (red, green, blue, yellow) of a token, the index is the token id
+TOKEN_REQUIREMENTS = tuple(
+    requirements for requirements in itertools.product(range(MAX_COUNT + 1), repeat=len(COLORS))
+    if sum(requirements) <= MAX_COUNT
+)
+TOKEN_IDS = {requirements: token_id for token_id, requirements in enumerate(TOKEN_REQUIREMENTS)}
+
+
+def build_satisfaction_table():
+    # One entry per count state: the bitset of the token ids satisfied by those color counts
+    color_masks = [[0] * (MAX_COUNT + 1) for _ in COLORS]
+    for token_id, requirements in enumerate(TOKEN_REQUIREMENTS):
+        for color_index, required_count in enumerate(requirements):
+            for count in range(required_count, MAX_COUNT + 1):
+                color_masks[color_index][count] |= 1 << token_id
+    red_masks, green_masks, blue_masks, yellow_masks = color_masks
+    return tuple(
+        red_masks[red] & green_masks[green] & blue_masks[blue] & yellow_masks[yellow]
+        for red, green, blue, yellow in itertools.product(range(MAX_COUNT + 1), repeat=len(COLORS))
+    )
+
+SATISFIED_TOKENS = build_satisfaction_table()
+
+
+def get_count_state(red, green, blue, yellow):
+    # Index of the color counts in SATISFIED_TOKENS, counts are capped at MAX_COUNT
+    state = min(red, MAX_COUNT)
+    state = state * (MAX_COUNT + 1) + min(green, MAX_COUNT)
+    state = state * (MAX_COUNT + 1) + min(blue, MAX_COUNT)
+    return state * (MAX_COUNT + 1) + min(yellow, MAX_COUNT)
+
+
 class Token:
     # A token indicates a possible mission to acomplish to earn a score. Token can contain a max sum of 4 of the 4 colors. Cards contain up to 3 tokens.
-    def __init__(self, red=None, green=None, blue=None, yellow=None, is_completed=False):
-        self.red = red
-        self.green = green
-        self.blue = blue
-        self.yellow = yellow
-        self.is_completed = is_completed  # Is the token's mission completed already
+    # Tokens are immutable and shared by every game, whether a token is completed is kept by the Game
+    __slots__ = ('red', 'green', 'blue', 'yellow', 'requirements', 'token_bit')
+
+    def __init__(self, red=None, green=None, blue=None, yellow=None):
+        object.__setattr__(self, 'red', red)
+        object.__setattr__(self, 'green', green)
+        object.__setattr__(self, 'blue', blue)
+        object.__setattr__(self, 'yellow', yellow)
+        # Required count of each color, in the order of COLORS
+        object.__setattr__(self, 'requirements', (red or 0, green or 0, blue or 0, yellow or 0))
+        # Bit of the token in the SATISFIED_TOKENS bitsets
+        object.__setattr__(self, 'token_bit', 1 << TOKEN_IDS[self.requirements])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Token is immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return Token, (self.red, self.green, self.blue, self.yellow)
+
+    def __repr__(self):
+        return f"Token(red={self.red}, green={self.green}, blue={self.blue}, yellow={self.yellow})"
 
 def get_token_with_colors(red_count=0, green_count=0, blue_count=0, yellow_count=0):
     token_dict = {
@@ -1,19 +1,13 @@
 import copy
 import logging
-import random
 import multiprocessing
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from transposition import TranspositionTable, compute_zobrist_hash
+from phase_timer import PhaseTimer
 
-def maxn_worker(args):
-    """Worker function for evaluating a move."""
-    game, move, depth, current_player = args
-    cloned_game = copy.deepcopy(game)
-    cloned_game.in_simulation = True  # Mark cloned game as simulation
-    cloned_current_player = next(p for p in cloned_game.players if p.name == current_player.name)
-    apply_move(cloned_game, cloned_current_player, move)
-    next_player = get_next_player(cloned_game, cloned_current_player)
-    child_values = maxn(cloned_game, depth - 1, next_player)
-
-    return move, child_values[current_player.name]
+logger = logging.getLogger(__name__)
 
 def create_process_logger():
     logger = logging.getLogger(f"Process-{multiprocessing.current_process().name}")
@@ -36,96 +30,530 @@ def initialize_process_logger():
     global process_logger
     process_logger = create_process_logger()
 
-def get_ai_move(game, ai_player, depth=3, possible_moves=None):
+class AIWorkerPool:
+    # Long-lived worker processes for the AI, created once per game session instead of once per move
+    # The pool starts as large as the first batch of moves needs and only grows (up to the core count) when a
+    # later move has more work, worker-side caches (Zobrist keys, card signatures) stay warm between moves
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.pool = None
+        self.size = 0
+
+    def map(self, func, tasks):
+        return self.get_pool(len(tasks)).map(func, tasks)
+
+    def imap_unordered(self, func, tasks):
+        # One task at a time from a shared queue, a worker that finishes early takes the next task
+        return self.get_pool(len(tasks)).imap_unordered(func, tasks, chunksize=1)
+
+    def get_pool(self, num_tasks):
+        needed_workers = max(1, min(num_tasks, self.max_workers))
+        if self.pool is None or needed_workers > self.size:
+            self.close()
+            # Workers share this process's resource tracker, so the SharedRootPosition blocks they attach are only
+            # cleaned up by the process that published them
+            resource_tracker.ensure_running()
+            self.pool = multiprocessing.Pool(processes=needed_workers, initializer=initialize_process_logger)
+            self.size = needed_workers
+        return self.pool
+
+    def close(self, wait=True):
+        # Shut the workers down, without waiting for running tasks if wait is False
+        if self.pool is not None:
+            if wait:
+                self.pool.close()
+            else:
+                self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class SharedRootPosition:
+    # The position of a turn as a Game.to_bytes snapshot in shared memory, published once for every worker task
+    # The tasks only carry its name and the move to search, each worker decodes it once per turn
+
+    def __init__(self, game):
+        data = game.to_bytes()
+        self.size = len(data)
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=self.size)
+        self.shared_memory.buf[:self.size] = data
+        self.name = self.shared_memory.name
+
+    def load(self):
+        # A copy of the published game, decoded like the workers decode it
+        from snapshot import game_from_bytes
+        return game_from_bytes(bytes(self.shared_memory.buf[:self.size]))
+
+    def close(self):
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+worker_root_position = None  # (shared memory name, game) of the root position this worker process decoded last
+
+def load_root_position(name, size):
+    # The game published as a SharedRootPosition, decoded once per turn and searched in place by every task
+    global worker_root_position
+    if worker_root_position is None or worker_root_position[0] != name:
+        from snapshot import game_from_bytes
+        if sys.version_info >= (3, 13):
+            root_memory = shared_memory.SharedMemory(name=name, track=False)  # The publishing process unlinks it
+        else:
+            # Pool workers share the resource tracker of the publishing process, it is unlinked only once
+            root_memory = shared_memory.SharedMemory(name=name)
+        try:
+            data = bytes(root_memory.buf[:size])
+        finally:
+            root_memory.close()
+        worker_root_position = (name, game_from_bytes(data))
+    return worker_root_position[1]
+
+class SearchBudgetExceeded(Exception):
+    # Raised inside maxn when the time or node budget of a search runs out
+    pass
+
+class SearchBudget:
+    # Counts the nodes of a search and stops it once the node budget or the wall-clock deadline is reached
+    # The deadline is an absolute time.time() value so it means the same in every worker process
+
+    def __init__(self, max_nodes=None, deadline=None):
+        self.max_nodes = max_nodes
+        self.deadline = deadline
+        self.nodes = 0
+
+    def charge(self):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchBudgetExceeded()
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchBudgetExceeded()
+
+class SearchStatistics:
+    # What the search of one AI decision did, returned by get_ai_move(return_statistics=True)
+    # Plies count from the root position (ply 0), ply 1 holds the positions after the AI's own move
+
+    def __init__(self):
+        self.search_depth = 0  # Depth of the iteration being searched
+        self.completed_depth = 0  # Depth of the deepest iteration that finished, the one the move comes from
+        self.nodes_by_ply = {}  # Ply -> positions visited, over every iteration
+        self.expanded_nodes = 0  # Positions whose moves were searched
+        self.searched_moves = 0  # Moves searched from those positions
+        self.pruned_moves = 0  # Moves not searched because an equivalent move was
+        self.transposition_hits = 0
+        self.transposition_misses = 0
+        self.pv_table = {}  # Ply -> best line found from the position at that ply, while searching
+        self.root_values = None  # Value vector of the best root move, while searching
+        self.principal_variation = []  # Best line of the completed iteration, cut where a transposition hit ended it
+        self.value = None  # Value vector at the end of the principal variation
+        self.task_cpu_times = []  # CPU seconds of every worker task, over every iteration
+
+    @property
+    def nodes(self):
+        return sum(self.nodes_by_ply.values())
+
+    def get_branching_factor(self):
+        # Average number of moves searched per expanded position
+        return self.searched_moves / self.expanded_nodes if self.expanded_nodes else 0
+
+    def visit(self, depth):
+        # A position at the given remaining depth of the current iteration, starts its line of the pv table
+        ply = self.search_depth - depth
+        self.nodes_by_ply[ply] = self.nodes_by_ply.get(ply, 0) + 1
+        self.pv_table[ply] = []
+        return ply
+
+    def expand(self, num_moves, num_pruned_moves=0):
+        self.expanded_nodes += 1
+        self.searched_moves += num_moves
+        self.pruned_moves += num_pruned_moves
+
+    def update_pv(self, ply, move):
+        # move is the new best move at ply, the line continues with the best line found below it
+        self.pv_table[ply] = [move] + self.pv_table.get(ply + 1, [])
+
+    def complete_iteration(self):
+        self.completed_depth = self.search_depth
+        self.principal_variation = self.pv_table.get(0, [])
+        self.value = self.root_values
+
+    def merge(self, other):
+        # Add the counts of the search of a worker process
+        for ply, nodes in other.nodes_by_ply.items():
+            self.nodes_by_ply[ply] = self.nodes_by_ply.get(ply, 0) + nodes
+        self.expanded_nodes += other.expanded_nodes
+        self.searched_moves += other.searched_moves
+        self.pruned_moves += other.pruned_moves
+        self.transposition_hits += other.transposition_hits
+        self.transposition_misses += other.transposition_misses
+
+    def add_transposition_statistics(self, transposition_table):
+        if transposition_table is not None:
+            self.transposition_hits += transposition_table.hits
+            self.transposition_misses += transposition_table.misses
+
+    def to_row(self):
+        # The SEARCH_FIELDS columns of the turn in thinking_times.csv
+        return {
+            'nodes': self.nodes,
+            'nodes_by_ply': ';'.join(str(self.nodes_by_ply[ply]) for ply in sorted(self.nodes_by_ply)),
+            'branching_factor': round(self.get_branching_factor(), 2),
+            'pruned_moves': self.pruned_moves,
+            'transposition_hits': self.transposition_hits,
+            'transposition_misses': self.transposition_misses,
+            'completed_depth': self.completed_depth,
+            'principal_variation': ' '.join(f"{card_position}@{x},{y}" for card_position, (x, y) in self.principal_variation),
+            'principal_values': ';'.join(f"{name}={value:.2f}" for name, value in (self.value or {}).items()),
+        }
+
+SEARCH_FIELDS = [
+    'nodes', 'nodes_by_ply', 'branching_factor', 'pruned_moves', 'transposition_hits', 'transposition_misses',
+    'completed_depth', 'principal_variation', 'principal_values'
+]
+
+def get_ai_move(game, ai_player, depth=3, possible_moves=None, use_transposition_table=False, time_budget=None, max_nodes=None, collapse_moves=True, rng=None, return_statistics=False):
+    # rng defaults to the game's random generator
+    # With return_statistics the result is (move, SearchStatistics)
+    # The transposition table is off by default: moves change the card board and the moon marker, so searches up
+    # to depth 4 reach no position twice (see benchmark.py transposition) and the table only costs time
+    statistics = SearchStatistics()
+    move = choose_ai_move(
+        game, ai_player, depth, possible_moves, use_transposition_table, time_budget, max_nodes, collapse_moves, rng,
+        statistics
+    )
+    if return_statistics:
+        return move, statistics
+    return move
+
+def choose_ai_move(game, ai_player, depth, possible_moves, use_transposition_table, time_budget, max_nodes, collapse_moves, rng, statistics):
     if possible_moves is None:
         possible_moves = get_possible_moves(game, ai_player)
 
     # Handle Random AI Personality
     if ai_player.ai_personality == "Random":
         if possible_moves:
-            selected_move = random.choice(possible_moves)
+            selected_move = (rng or game.rng).choice(possible_moves)
             return selected_move
-        process_logger.info(f"Random AI has no valid moves.")
+        logger.info("Random AI has no valid moves.")
         return None  # No possible moves
     
     # Run the immediate winning move pre-check only if the player is close to winning
     if ai_player.score == game.goal - 2:
         for move in possible_moves:
-            cloned_game = copy.deepcopy(game)
-            cloned_ai_player = next(p for p in cloned_game.players if p.name == ai_player.name)
-
-            apply_move(cloned_game, cloned_ai_player, move)
-
-            # Check if this move results in a win
-            if cloned_ai_player.score >= cloned_game.goal:
-                print(f"Immediate winning move found: {move}")
+            # Check if this move results in a win, the tokens it completes are counted without making it
+            card_position, (x, y) = move
+            completed_tokens = game.count_placement_tokens(ai_player, game.card_board[card_position], x, y)
+            if ai_player.score + completed_tokens >= game.goal:
+                logger.debug(f"Immediate winning move found: {move}")
+                statistics.principal_variation = [move]
                 return move  # Immediately select the winning move
 
+    # Without a budget the search runs to the given depth, with one it deepens iteratively up to that depth
+    # and keeps the best move of the deepest iteration that finished in time
+    if time_budget is None and max_nodes is None:
+        search_depths = [depth]
+    else:
+        search_depths = range(1, depth + 1)
+    deadline = time.time() + time_budget if time_budget is not None else None
+
     # Use multiprocessing for AI computation only if not in simulation mode or if single simulation
     if not game.simulation_mode or game.is_single_simulation:
-        with multiprocessing.Pool(
-            processes=multiprocessing.cpu_count(),
-            initializer=initialize_process_logger
-        ) as pool:
-            results = pool.map(
-                evaluate_move_multiprocess,
-                [(game, ai_player, move, depth) for move in possible_moves]
-            )
-        
-        # select the move with the highest score
         best_move = None
         best_value = float('-inf')
-        for move, value in results:
-            print(f"Move {move} evaluated with value {value}")
-            if value > best_value:
-                best_value = value
-                best_move = move
-        print(f"AI selected move {best_move} with value {best_value}")
+        remaining_nodes = max_nodes
+        with SharedRootPosition(game) as root_position:
+            best_move, best_value = search_root_in_workers(
+                game, ai_player, possible_moves, search_depths, use_transposition_table, deadline, remaining_nodes,
+                collapse_moves, statistics, root_position
+            )
+
+        if best_move is None and possible_moves:
+            best_move = possible_moves[0]  # Not even the first iteration finished
+        logger.debug(f"AI selected move {best_move} with value {best_value}")
         return best_move
 
     # Sequential fallback for simulation mode
+    # A single copy of the game is searched, moves are applied and taken back in place
+    search_game = copy_game(game)
+    search_ai_player = next(p for p in search_game.players if p.name == ai_player.name)
+    transposition_table = TranspositionTable(max_nodes=max_nodes) if use_transposition_table else None
+    if transposition_table is not None:
+        search_game.zobrist_hash = compute_zobrist_hash(search_game)  # Without a table the hash is left None
+    budget = SearchBudget(max_nodes=max_nodes, deadline=deadline)
+
+    # Set the score_at_turn_start before applying the moves
+    search_ai_player.score_at_turn_start = search_ai_player.score
+
     best_move = None
     best_value = float('-inf')
-    for move in possible_moves:
-        cloned_game = copy.deepcopy(game)
-        cloned_ai_player = next(p for p in cloned_game.players if p.name == ai_player.name)
-        
-        # Set the score_at_turn_start before applying the move
-        cloned_ai_player.score_at_turn_start = cloned_ai_player.score
-        
-        apply_move(cloned_game, cloned_ai_player, move)
-        
-        values = maxn(cloned_game, depth - 1, cloned_ai_player)
+    try:
+        for search_depth in search_depths:
+            statistics.search_depth = search_depth
+            try:
+                best_move, best_value = search_root(
+                    search_game, search_ai_player, possible_moves, search_depth, transposition_table, budget,
+                    collapse_moves, statistics
+                )
+            except SearchBudgetExceeded:
+                break  # Keep the result of the previous iteration
+            statistics.complete_iteration()
+    finally:
+        statistics.add_transposition_statistics(transposition_table)
+
+    if best_move is None and possible_moves:
+        best_move = possible_moves[0]  # Not even the first iteration finished
+    logger.debug(f"AI selected move {best_move} with value {best_value}")
+    return best_move
+
+def search_root_in_workers(game, ai_player, possible_moves, search_depths, use_transposition_table, deadline, remaining_nodes, collapse_moves, statistics, root_position):
+    # The top plies of the tree are expanded here, every position below them is searched by a worker process
+    # The tasks go through one shared queue so idle workers keep taking work while a large subtree is searched
+    # Returns the best move and its value of the deepest iteration that finished
+    best_move = None
+    best_value = float('-inf')
+    if not possible_moves:
+        return best_move, best_value
+    ai_pool = game.ai_pool or AIWorkerPool()
+    # The plan is made on the decoded root position, the same game the workers search
+    plan_game = root_position.load()
+    plan_player = next(p for p in plan_game.players if p.name == ai_player.name)
+    try:
+        for search_depth in search_depths:
+            statistics.search_depth = search_depth
+            plan, tasks = plan_parallel_search(
+                plan_game, plan_player, possible_moves, search_depth, ai_pool.max_workers, collapse_moves, statistics
+            )
+            node_share = remaining_nodes // len(tasks) if remaining_nodes is not None and tasks else None
+            worker_tasks = [
+                (
+                    root_position.name, root_position.size, path, in_simulation, player_name, depth, search_depth,
+                    use_transposition_table, deadline, node_share, collapse_moves, game.phase_timer is not None
+                )
+                for path, in_simulation, player_name, depth in tasks
+            ]
+            results = [None] * len(tasks)
+            for task_index, result in ai_pool.imap_unordered(evaluate_node_multiprocess, list(enumerate(worker_tasks))):
+                results[task_index] = result
+            for _, nodes, worker_timer, worker_statistics, cpu_time in results:
+                statistics.task_cpu_times.append(cpu_time)
+                if game.phase_timer is not None:
+                    game.phase_timer.merge(worker_timer)
+                statistics.merge(worker_statistics)
+                if remaining_nodes is not None:
+                    remaining_nodes -= nodes
+            if any(values is None for values, _, _, _, _ in results):
+                break  # The budget ran out during this iteration
+
+            # select the move with the highest score
+            best_move = None
+            best_value = float('-inf')
+            _, _, root_children = plan
+            for move, child in root_children:
+                values, line = resolve_parallel_search(child, results)
+                value = values[ai_player.name]
+                if value > best_value:
+                    best_value = value
+                    best_move = move
+                    statistics.pv_table[0] = [move] + line
+                    statistics.root_values = values
+            statistics.complete_iteration()
+    finally:
+        if game.ai_pool is None:
+            ai_pool.close()  # No session pool, the temporary one only lives for this move
+    return best_move, best_value
+
+def plan_parallel_search(game, ai_player, possible_moves, depth, num_workers, collapse_moves, statistics):
+    # Splits the search into worker tasks, one ply deeper at a time until there are enough tasks to keep every
+    # worker busy while the subtrees finish at different times. The last two plies always stay in the tasks.
+    # Returns the plan tree (see plan_node) and the tasks as (path, in_simulation, player name, depth)
+    split_plies = 1
+    while True:
+        tasks = []
+        plan_statistics = SearchStatistics()
+        plan_statistics.search_depth = depth
+        plan = plan_node(game, depth, ai_player, split_plies, [], tasks, collapse_moves, plan_statistics, possible_moves)
+        if len(tasks) >= num_workers * TASKS_PER_WORKER or split_plies >= depth - 2:
+            statistics.merge(plan_statistics)
+            return plan, tasks
+        split_plies += 1
+
+TASKS_PER_WORKER = 8  # Worker tasks wanted per worker, the more tasks the better the load balance and the higher the overhead
+
+def plan_node(game, depth, current_player, split_plies, path, tasks, collapse_moves, statistics, root_moves=None):
+    """
+    Expands the position like maxn for split_plies plies and records the positions below them as tasks.
+    Nodes of the plan are ('values', values, line) for positions evaluated here, ('task', index) for the tasks and
+    ('node', player name, [(move, child node), ...]) for the expanded positions.
+    root_moves are the moves of the root position, which is searched like search_root: without marking the game
+    as in simulation before the first move.
+    """
+    if root_moves is None:
+        if split_plies == 0 and depth > 0:
+            # The path replays every move with the in_simulation flag it was applied with
+            tasks.append((tuple(path), game.in_simulation, current_player.name, depth))
+            return ('task', len(tasks) - 1)
+        statistics.visit(depth)
+        if depth == 0 or game.is_game_over():
+            return ('values', evaluate_game_state(game, current_player), [])
+        possible_moves = get_possible_moves(game, current_player)
+        if not possible_moves:
+            next_player = get_next_player(game, current_player)
+            return plan_node(game, depth, next_player, split_plies, path, tasks, collapse_moves, statistics)
+    else:
+        statistics.visit(depth)
+        possible_moves = root_moves
+    num_moves = len(possible_moves)
+    if collapse_moves and depth == 1:
+        possible_moves = collapse_equivalent_moves(game, current_player, possible_moves)
+    statistics.expand(len(possible_moves), num_moves - len(possible_moves))
+
+    children = []
+    in_simulation = game.in_simulation
+    if root_moves is None:
+        game.in_simulation = True
+    try:
+        for move in possible_moves:
+            path.append((current_player.name, move, game.in_simulation))
+            undo_record = apply_move(game, current_player, move)
+            try:
+                # Like search_root, the positions after a root move are searched with the AI player to move
+                next_player = current_player if root_moves is not None else get_next_player(game, current_player)
+                children.append((move, plan_node(
+                    game, depth - 1, next_player, split_plies - 1, path, tasks, collapse_moves, statistics
+                )))
+            finally:
+                undo_move(game, undo_record)
+                path.pop()
+    finally:
+        game.in_simulation = in_simulation
+    return ('node', current_player.name, children)
+
+def resolve_parallel_search(node, results):
+    # Values and best line of a plan node, once the tasks have their results
+    # Picks the children like maxn: the first child with the highest value of the player to move
+    if node[0] == 'values':
+        return node[1], node[2]
+    if node[0] == 'task':
+        values, _, _, worker_statistics, _ = results[node[1]]
+        return values, worker_statistics.principal_variation
+    _, player_name, children = node
+    values = None
+    line = []
+    for move, child in children:
+        child_values, child_line = resolve_parallel_search(child, results)
+        if values is None or child_values[player_name] > values[player_name]:
+            values = child_values
+            line = [move] + child_line
+    return values, line
+
+def search_root(game, ai_player, possible_moves, depth, transposition_table=None, budget=None, collapse_moves=False, statistics=None):
+    # Evaluates every root move to the given depth, returns the best move and its value
+    root_moves = possible_moves
+    if collapse_moves and depth == 1:
+        root_moves = collapse_equivalent_moves(game, ai_player, possible_moves)
+    if statistics is not None:
+        statistics.visit(depth)
+        statistics.expand(len(root_moves), len(possible_moves) - len(root_moves))
+    best_move = None
+    best_value = float('-inf')
+    for move in root_moves:
+        undo_record = apply_move(game, ai_player, move)
+        try:
+            values = maxn(game, depth - 1, ai_player, transposition_table, budget, collapse_moves, statistics)
+        finally:
+            undo_move(game, undo_record)
         ai_value = values[ai_player.name]
-        print(f"Move {move} evaluated with value {ai_value}")
-        
+
         # Keep track of the best move
         if ai_value > best_value:
             best_value = ai_value
             best_move = move
+            if statistics is not None:
+                statistics.update_pv(0, move)
+                statistics.root_values = values
+    return best_move, best_value
 
-    print(f"AI selected move {best_move} with value {best_value}")
-    return best_move
-
-def evaluate_move_multiprocess(args):
+def evaluate_node_multiprocess(indexed_task):
     """
     Helper function for multiprocessing.
-    Evaluates a single move and returns the move and its value.
+    Replays the path of a plan_parallel_search task on the SharedRootPosition, searches the position it reaches and
+    takes the path back. Returns the task index with its values (None if the budget ran out), the nodes searched,
+    the worker's PhaseTimer (None when the game is not timed), its SearchStatistics and the CPU seconds it took.
     """
-    game, ai_player, move, depth = args
-    cloned_game = copy.deepcopy(game)
-    cloned_ai_player = next(p for p in cloned_game.players if p.name == ai_player.name)
-    apply_move(cloned_game, cloned_ai_player, move)
-    values = maxn(cloned_game, depth - 1, cloned_ai_player)
+    task_index, task = indexed_task
+    (root_name, root_size, path, node_in_simulation, player_name, depth, search_depth, use_transposition_table,
+     deadline, max_nodes, collapse_moves, time_phases) = task
+    cpu_start_time = time.process_time()
+    game = load_root_position(root_name, root_size)
+    game.phase_timer = PhaseTimer() if time_phases else None  # Only this task's phases, the caller adds them up
+    game.zobrist_hash = None
+    players = {player.name: player for player in game.players}
+    in_simulation = game.in_simulation
+    undo_records = []
+    transposition_table = TranspositionTable(max_nodes=max_nodes) if use_transposition_table else None
+    budget = SearchBudget(max_nodes=max_nodes, deadline=deadline)
+    statistics = SearchStatistics()
+    statistics.search_depth = search_depth
+    values = None
+    try:
+        for move_player_name, move, move_in_simulation in path:
+            game.in_simulation = move_in_simulation
+            undo_records.append(apply_move(game, players[move_player_name], move))
+        game.in_simulation = node_in_simulation
+        if transposition_table is not None:
+            game.zobrist_hash = compute_zobrist_hash(game)
+        values = maxn(game, depth, players[player_name], transposition_table, budget, collapse_moves, statistics)
+    except SearchBudgetExceeded:
+        pass
+    finally:
+        game.zobrist_hash = None
+        for undo_record in reversed(undo_records):
+            undo_move(game, undo_record)
+        game.in_simulation = in_simulation
+        statistics.add_transposition_statistics(transposition_table)
+    # The line from the task's position, the worker's own pv table starts at its ply
+    statistics.principal_variation = statistics.pv_table.get(search_depth - depth, [])
 
     # Log within this process using process-specific logger
-    process_logger.info(f"Evaluated move {move} with value {values[cloned_ai_player.name]}")
+    process_logger.info(f"Searched {len(path)} moves deep task with {budget.nodes} nodes")
 
-    return move, values[cloned_ai_player.name]
+    return task_index, (values, budget.nodes, game.phase_timer, statistics, time.process_time() - cpu_start_time)
 
-def maxn(game, depth, current_player):
+def maxn(game, depth, current_player, transposition_table=None, budget=None, collapse_moves=False, statistics=None):
+    if budget is not None:
+        budget.charge()
+    if statistics is not None:
+        ply = statistics.visit(depth)
+    timer = game.phase_timer
     if depth == 0 or game.is_game_over():
-        return evaluate_game_state(game, current_player)
+        if timer is None:
+            return evaluate_game_state(game, current_player)
+        started = time.perf_counter()
+        values = evaluate_game_state(game, current_player)
+        timer.add('evaluation', started)
+        return values
+
+    # Positions reached through a different move order are only searched once
+    if transposition_table is not None:
+        if timer is not None:
+            started = time.perf_counter()
+        position_key = transposition_table.position_key(game, current_player)
+        stored_values = transposition_table.lookup(position_key, depth)
+        if timer is not None:
+            timer.add('transposition', started)
+        if stored_values is not None:
+            return stored_values
 
     values = {player.name: float('-inf') for player in game.players}
     possible_moves = get_possible_moves(game, current_player)
@@ -133,65 +561,120 @@ def maxn(game, depth, current_player):
     if not possible_moves:
         # If no moves can be made, move to the next player
         next_player = get_next_player(game, current_player)
-        return maxn(game, depth, next_player)
+        return maxn(game, depth, next_player, transposition_table, budget, collapse_moves, statistics)
 
-    # Sequential fallback for depths other than root
-    for move in possible_moves:
-        cloned_game = copy.deepcopy(game)
-        cloned_game.in_simulation = True  # Ensure cloned game is marked as simulation
-        cloned_current_player = next(p for p in cloned_game.players if p.name == current_player.name)
-        apply_move(cloned_game, cloned_current_player, move)
-        
-        next_player = get_next_player(cloned_game, cloned_current_player)
-        child_values = maxn(cloned_game, depth - 1, next_player)
-        if child_values[current_player.name] > values[current_player.name]:
-            values = child_values
+    # One ply above the leaves, equivalent placements are only evaluated once
+    num_moves = len(possible_moves)
+    if collapse_moves and depth == 1:
+        possible_moves = collapse_equivalent_moves(game, current_player, possible_moves)
+    if statistics is not None:
+        statistics.expand(len(possible_moves), num_moves - len(possible_moves))
 
+    # Sequential fallback for depths other than root
+    # Every child is searched on the same game object: apply the move, recurse, then take it back
+    # The game is restored even when the search budget runs out in a subtree
+    in_simulation = game.in_simulation
+    game.in_simulation = True  # Ensure the searched game is marked as simulation
+    try:
+        for move in possible_moves:
+            undo_record = apply_move(game, current_player, move)
+            try:
+                next_player = get_next_player(game, current_player)
+                child_values = maxn(game, depth - 1, next_player, transposition_table, budget, collapse_moves, statistics)
+            finally:
+                undo_move(game, undo_record)
+            if child_values[current_player.name] > values[current_player.name]:
+                values = child_values
+                if statistics is not None:
+                    statistics.update_pv(ply, move)
+    finally:
+        game.in_simulation = in_simulation
+
+    if transposition_table is not None:
+        if timer is not None:
+            started = time.perf_counter()
+        transposition_table.store(position_key, depth, values)
+        if timer is not None:
+            timer.add('transposition', started)
     return values
 
 def get_possible_moves(game, player):
-    possible_moves = []
+    # The placement cells are the same for every available card, so they are only looked up once
+    timer = game.phase_timer
+    if timer is not None:
+        started = time.perf_counter()
     available_positions = game.get_available_card_positions()
-    min_x, max_x, min_y, max_y = player.inventory.get_inventory_bounds()
-
-    for card_position in available_positions:
-        card = game.card_board[card_position]
-        # Generate legal moves
-        for x in range(min_x - 1, max_x + 2):
-            for y in range(min_y - 1, max_y + 2):
-                if game.is_valid_placement(player, x, y):
-                    possible_moves.append((card_position, (x, y)))
+    placement_cells = player.inventory.get_placement_cells()
+    possible_moves = [
+        (card_position, cell)
+        for card_position in available_positions
+        for cell in placement_cells
+    ]
+    if timer is not None:
+        timer.add('move_generation', started)
     return possible_moves
 
-def apply_move(game, player, move):
-    # Temporarily set the logger level to WARNING to suppress other logs
-    original_level = logging.getLogger().getEffectiveLevel()
-    logging.getLogger().setLevel(logging.WARNING)
-
-    try:
+def collapse_equivalent_moves(game, player, possible_moves):
+    # Keeps the first move of every equivalence class, in the original order, so ties are still won by the same move
+    # Moves lead to positions that evaluate the same, as long as nothing is searched after them, when the card moves
+    # the player as far and completes as many tokens: evaluate_game_state only sees the scores and the movement,
+    # and the movement also decides who is evaluated next. Which card, slot, tokens and cell do not matter, so
+    # identical cards in different slots and different cards of the same movement share a class.
+    # The tokens a move completes are counted in two parts that other moves share: the satisfied tokens of the
+    # cell for the card's own tokens, and the tokens of the other cards, which only depend on the card's color
+    timer = game.phase_timer
+    if timer is not None:
+        started = time.perf_counter()
+    representatives = {}
+    cell_tokens = {}  # (x, y) -> tokens the color counts around (x, y) satisfy
+    region_tokens = {}  # (color, x, y) -> tokens of the other cards a card of that color completes at (x, y)
+    for move in possible_moves:
         card_position, (x, y) = move
         card = game.card_board[card_position]
-        player.inventory.add_card(card, x, y)  # This call generates logs
-        game.card_board[card_position] = None
-        game.move_player(player, card)
-
-        # Remove moon marker from current position
-        for i in range(len(game.card_board)):
-            if game.card_board[i] == game.moon_marker:
-                game.card_board[i] = None
-                break
-
-        # Move moon marker to new position
-        game.moon_marker_position = card_position
-        game.card_board[card_position] = game.moon_marker
-
-        if game.get_number_of_cards_on_board() < 3:
-            game.deal()
-        game.check_inventory(player)
-        game.check_end_game()
-    finally:
-        # Restore the original logger level after suppression
-        logging.getLogger().setLevel(original_level)
+        satisfied_tokens = cell_tokens.get((x, y))
+        if satisfied_tokens is None:
+            satisfied_tokens = cell_tokens[(x, y)] = game.get_satisfied_tokens(player, x, y)
+        other_tokens = region_tokens.get((card.color, x, y))
+        if other_tokens is None:
+            other_tokens = region_tokens[(card.color, x, y)] = game.count_region_tokens(player, card.color, x, y)
+        completed_tokens = game.count_card_tokens(card, satisfied_tokens) + other_tokens
+        representatives.setdefault((card.movement, completed_tokens), move)
+    if timer is not None:
+        timer.add('move_generation', started)
+    return list(representatives.values())
+
+def apply_move(game, player, move):
+    # Make a move in place, take it back with undo_move
+    timer = game.phase_timer
+    if timer is None:
+        return game.do_move(player, move)
+    started = time.perf_counter()
+    undo_record = game.do_move(player, move)
+    timer.add('apply_move', started)
+    return undo_record
+
+def undo_move(game, undo_record):
+    # Take back a move applied with apply_move
+    timer = game.phase_timer
+    if timer is None:
+        game.undo_move(undo_record)
+        return
+    started = time.perf_counter()
+    game.undo_move(undo_record)
+    timer.add('undo_move', started)
+
+def copy_game(game):
+    # The private copy of the game a search runs on, its moves go to the game's event trace
+    timer = game.phase_timer
+    if timer is None:
+        search_game = copy.deepcopy(game)
+    else:
+        started = time.perf_counter()
+        search_game = copy.deepcopy(game)
+        timer.add('copy', started)
+        search_game.phase_timer = timer  # The copy's phases are part of this turn
+    search_game.event_trace = game.event_trace
+    return search_game
 
 
 def evaluate_game_state(game, ai_player):
@@ -262,40 +745,11 @@ def get_token_progress(game, player, token):
     return progress
 
 def get_color_counts(game, player):
-    counts = {color: 0 for color in ['red', 'green', 'blue', 'yellow']}
-    visited_positions = set()
-
-    for position, card in player.inventory.grid.items():
-        if position in visited_positions:
-            continue
-        color = card.color
-        if color in counts:
-            chain_size, visited = game.count_color_chain(
-                player, position[0], position[1], color
-            )
-            counts[color] = max(counts[color], chain_size)
-            visited_positions.update(visited)
-
-    return counts
+    # Size of the player's largest region of each color
+    return player.inventory.get_largest_regions()
 
 def get_consecutive_turns(game, player):
-    count = 0
-    # Check in reverse order how many times they had consecutive turns
-    for player_name in reversed(game.turn_order):
-        if player_name == player.name:
-            count += 1
-        else:
-            break
-    return count
+    return game.turn_order.get_consecutive_turns(player.name)
 
 def get_next_player(game, current_player):
-    least_movement = min(p.total_movement for p in game.players)
-    candidates = [p for p in game.players if p.total_movement == least_movement]
-    if len(candidates) == 1:
-        next_player = candidates[0]
-    else:
-        for player_name in reversed(game.turn_order):
-            if player_name in [p.name for p in candidates]:
-                next_player = next(p for p in game.players if p.name == player_name)
-                break
-    return next_player
+    return game.get_next_player()
@@ -0,0 +1,1175 @@
+import argparse
+import contextlib
+import copy
+import hashlib
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource  # Peak memory of the suite cases, not available on Windows
+except ImportError:
+    resource = None
+
+import ai
+from Card import Card
+from card_generator import CARD_CATALOG
+from event_trace import EventTrace
+from Token import COLORS, SATISFIED_TOKENS, TOKEN_REQUIREMENTS, Token, get_count_state
+from game import Game, TurnOrder, create_game_rng
+from Inventory import Inventory
+from phase_timer import PHASES
+from Player import Player
+from transposition import TranspositionTable, compute_zobrist_hash
+
+# Run this file to measure the performance of the AI search, e.g.:
+#   python benchmark.py make-unmake --depth 2
+#   python benchmark.py trace --depth 2 --turns 4 24
+#   python benchmark.py transposition --depth 3
+#   python benchmark.py regions --cards 50 200 400
+#   python benchmark.py pool --depths 1 2
+#   python benchmark.py root-position --turns 4 24 40 --depths 1 2
+#   python benchmark.py parallel --turns 4 --depth 4 --workers 1 2 4 8 16
+#   python benchmark.py move-generation --cards 10 50 200
+#   python benchmark.py equivalence --depth 2
+#   python benchmark.py win-check --turns 4 24 48
+#   python benchmark.py bookkeeping --turns 100 10000 1000000
+#   python benchmark.py game-copy --turns 0 12 24
+#   python benchmark.py token-checks --cards 25 100 400
+#   python benchmark.py token-table
+#   python benchmark.py inventory-engines --cards 10 25 100 400
+#   python benchmark.py cold-start
+#   python benchmark.py phases --depth 2 --moves 5
+#   python benchmark.py snapshot --turns 0 12 40
+#   python benchmark.py suite --max-depth 3            (add --save-baseline to record benchmark_baseline.json)
+
+
+def build_position(num_players, num_turns, seed):
+    # Create a game and play random moves to reach a mid/late-game position
+    random.seed(seed)
+    game = Game(num_players, goal=100, simulation_mode=True)
+    for player in game.players:
+        player.is_ai = True
+    for _ in range(num_turns):
+        if game.is_game_over():
+            break
+        player = game.players[game.current_player_index]
+        possible_moves = ai.get_possible_moves(game, player)
+        if not possible_moves:
+            break
+        ai.apply_move(game, player, random.choice(possible_moves))
+        game.turn_order.append(player.name)
+        game.current_player_index = game.players.index(ai.get_next_player(game, player))
+    return game
+
+
+def legacy_maxn(game, depth, current_player, counter):
+    # The search as it was before make/unmake: one deepcopy of the game per child node
+    if depth == 0 or game.is_game_over():
+        return ai.evaluate_game_state(game, current_player)
+
+    values = {player.name: float('-inf') for player in game.players}
+    possible_moves = ai.get_possible_moves(game, current_player)
+
+    if not possible_moves:
+        next_player = ai.get_next_player(game, current_player)
+        return legacy_maxn(game, depth, next_player, counter)
+
+    for move in possible_moves:
+        cloned_game = copy.deepcopy(game)
+        cloned_game.in_simulation = True
+        cloned_current_player = next(p for p in cloned_game.players if p.name == current_player.name)
+        ai.apply_move(cloned_game, cloned_current_player, move)
+        counter[0] += 1
+
+        next_player = ai.get_next_player(cloned_game, cloned_current_player)
+        child_values = legacy_maxn(cloned_game, depth - 1, next_player, counter)
+        if child_values[current_player.name] > values[current_player.name]:
+            values = child_values
+
+    return values
+
+
+@contextlib.contextmanager
+def count_nodes(counter):
+    # Count every move applied by the search
+    original_apply_move = ai.apply_move
+
+    def counting_apply_move(game, player, move):
+        counter[0] += 1
+        return original_apply_move(game, player, move)
+
+    ai.apply_move = counting_apply_move
+    try:
+        yield
+    finally:
+        ai.apply_move = original_apply_move
+
+
+@contextlib.contextmanager
+def legacy_move_logging():
+    # The logging of every searched move before the event trace: apply_move lowered the root logger to WARNING
+    # around each move to hide the INFO line add_card built for it, and restored it afterwards
+    original_apply_move = ai.apply_move
+    inventory_logger = logging.getLogger('Inventory')
+
+    def logging_apply_move(game, player, move):
+        original_level = logging.getLogger().getEffectiveLevel()
+        logging.getLogger().setLevel(logging.WARNING)
+        try:
+            _, (x, y) = move
+            inventory_logger.info(f"Adding card at ({x}, {y})")
+            return original_apply_move(game, player, move)
+        finally:
+            logging.getLogger().setLevel(original_level)
+
+    ai.apply_move = logging_apply_move
+    try:
+        yield
+    finally:
+        ai.apply_move = original_apply_move
+
+
+def bench_make_unmake(args):
+    # Compare the node rate of the deepcopy search and the make/unmake search on the same positions
+    print(f"{'players':>7} {'cards':>6} {'nodes':>8} {'deepcopy n/s':>13} {'make/unmake n/s':>16} {'speedup':>8}")
+    failed = False
+    for num_players in (1, 2, 4):
+        for num_turns in args.turns:
+            game = build_position(num_players, num_turns, args.seed)
+            player = game.players[game.current_player_index]
+            cards = sum(len(p.inventory.grid) for p in game.players)
+
+            random.seed(args.seed)
+            counter = [0]
+            start_time = time.perf_counter()
+            legacy_values = legacy_maxn(copy.deepcopy(game), args.depth, player, counter)
+            legacy_time = time.perf_counter() - start_time
+            legacy_nodes = counter[0]
+
+            random.seed(args.seed)
+            counter = [0]
+            search_game = copy.deepcopy(game)
+            search_player = next(p for p in search_game.players if p.name == player.name)
+            with count_nodes(counter):
+                start_time = time.perf_counter()
+                values = ai.maxn(search_game, args.depth, search_player)
+                new_time = time.perf_counter() - start_time
+            nodes = counter[0]
+
+            if values != legacy_values or nodes != legacy_nodes:
+                print(f"WARNING: searches disagree for {num_players} players after {num_turns} turns")
+                failed = True
+            print(f"{num_players:>7} {cards:>6} {nodes:>8} {legacy_nodes / legacy_time:>13.0f} "
+                  f"{nodes / new_time:>16.0f} {legacy_time / new_time:>7.1f}x")
+    if failed:
+        print("The deepcopy and the make/unmake searches disagree.")
+        sys.exit(1)
+
+
+def bench_trace(args):
+    # Node rate of the same search with the old per-move logging, without tracing, and tracing every searched
+    # move into the ring buffer and into a trace file
+    print(f"{'players':>7} {'cards':>6} {'nodes':>8} {'logging n/s':>12} {'off n/s':>10} {'ring n/s':>10} "
+          f"{'file n/s':>10} {'events':>8}")
+    trace_path = os.path.join(tempfile.mkdtemp(), 'search.trace')
+    for num_players in (1, 2, 4):
+        for num_turns in args.turns:
+            game = build_position(num_players, num_turns, args.seed)
+            player = game.players[game.current_player_index]
+            cards = sum(len(p.inventory.grid) for p in game.players)
+            rates = []
+            for setting in ('logging', 'off', 'ring', 'file'):
+                if setting == 'ring':
+                    game.event_trace = EventTrace()
+                elif setting == 'file':
+                    game.event_trace = EventTrace(path=trace_path)
+                counter = [0]
+                with contextlib.ExitStack() as stack:
+                    if setting == 'logging':
+                        stack.enter_context(legacy_move_logging())
+                    stack.enter_context(count_nodes(counter))
+                    start_time = time.perf_counter()
+                    ai.maxn(game, args.depth, player)
+                    search_time = time.perf_counter() - start_time
+                if game.event_trace is not None:
+                    game.event_trace.close()
+                    events = game.event_trace.recorded
+                    game.event_trace = None
+                rates.append(counter[0] / search_time)
+            print(f"{num_players:>7} {cards:>6} {counter[0]:>8} {rates[0]:>12.0f} {rates[1]:>10.0f} {rates[2]:>10.0f} "
+                  f"{rates[3]:>10.0f} {events:>8}")
+    os.remove(trace_path)
+
+
+def bench_transposition(args):
+    # Compare the maxn search with and without the transposition table on the same positions
+    print(f"{'players':>7} {'cards':>6} {'nodes':>8} {'nodes (tt)':>11} {'time':>8} {'time (tt)':>10} "
+          f"{'hits':>7} {'misses':>7} {'collisions':>10}")
+    for num_players in (1, 2, 4):
+        for num_turns in args.turns:
+            game = build_position(num_players, num_turns, args.seed)
+            game.zobrist_hash = compute_zobrist_hash(game)
+            player = game.players[game.current_player_index]
+            cards = sum(len(p.inventory.grid) for p in game.players)
+
+            timings = []
+            for transposition_table in (None, TranspositionTable()):
+                random.seed(args.seed)
+                counter = [0]
+                with count_nodes(counter):
+                    start_time = time.perf_counter()
+                    ai.maxn(game, args.depth, player, transposition_table)
+                    timings.append((counter[0], time.perf_counter() - start_time))
+
+            (nodes, search_time), (tt_nodes, tt_search_time) = timings
+            statistics = transposition_table.get_statistics()
+            print(f"{num_players:>7} {cards:>6} {nodes:>8} {tt_nodes:>11} {search_time:>7.2f}s {tt_search_time:>9.2f}s "
+                  f"{statistics['hits']:>7} {statistics['misses']:>7} {statistics['collisions']:>10}")
+
+
+def build_inventory(num_cards, seed, inventory_engine='dict'):
+    # A random inventory grown card by card, larger than a real game can reach if asked to
+    rng = random.Random(seed)
+    player = Player('white', 'Player1', inventory_engine=inventory_engine)
+    inventory = player.inventory
+    frontier = [(0, 0)]
+    for _ in range(num_cards):
+        x, y = frontier.pop(rng.randrange(len(frontier)))
+        inventory.add_card(Card(rng.choice(['red', 'green', 'blue', 'yellow']), 1, []), x, y)
+        for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
+            position = (x + dx, y + dy)
+            if position not in inventory.grid and position not in frontier:
+                frontier.append(position)
+    return player
+
+
+def legacy_count_color_chain(player, x, y, color, exclude_position=None):
+    # The recursive flood fill Game used for the color counts before the region index
+    directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+    visited = set()
+    count = legacy_count_color_chain_recursive(player, x, y, color, visited, directions, exclude_position)
+    return count, visited
+
+
+def legacy_count_color_chain_recursive(player, nx, ny, color, visited, directions, exclude_position):
+    if (nx, ny) in visited or (exclude_position and (nx, ny) == exclude_position):
+        return 0
+    visited.add((nx, ny))
+    count = 1
+    for dx, dy in directions:
+        adj_x, adj_y = nx + dx, ny + dy
+        neighbor_card = player.inventory.get_card(adj_x, adj_y)
+        if neighbor_card and neighbor_card.color == color:
+            count += legacy_count_color_chain_recursive(player, adj_x, adj_y, color, visited, directions, exclude_position)
+    return count
+
+
+def flood_fill_adjacent_counts(player, x, y):
+    # Color counts around (x, y) computed the way the token checks did before the region index
+    counts = {color: 0 for color in ['red', 'green', 'blue', 'yellow']}
+    for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
+        neighbor_card = player.inventory.get_card(x + dx, y + dy)
+        if neighbor_card:
+            chain_count, _ = legacy_count_color_chain(player, x + dx, y + dy, neighbor_card.color, exclude_position=(x, y))
+            counts[neighbor_card.color] += chain_count
+    return counts
+
+
+def bench_regions(args):
+    # Color counts around every card of an inventory: recursive flood fills against the region index
+    print(f"{'cards':>6} {'flood fill':>11} {'region index':>13} {'speedup':>8} "
+          f"{'largest (flood)':>16} {'largest (index)':>16}")
+    for num_cards in args.cards:
+        player = build_inventory(num_cards, args.seed)
+        positions = list(player.inventory.grid)
+
+        start_time = time.perf_counter()
+        for x, y in positions:
+            flood_fill_adjacent_counts(player, x, y)
+        flood_fill_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for x, y in positions:
+            for color in ['red', 'green', 'blue', 'yellow']:
+                player.inventory.get_adjacent_region_size(x, y, color)
+        index_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        visited_positions = set()
+        for (x, y), card in player.inventory.grid.items():
+            if (x, y) not in visited_positions:
+                _, visited = legacy_count_color_chain(player, x, y, card.color)
+                visited_positions.update(visited)
+        largest_flood_fill_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        player.inventory.get_largest_regions()
+        largest_index_time = time.perf_counter() - start_time
+
+        print(f"{num_cards:>6} {flood_fill_time * 1000:>9.1f}ms {index_time * 1000:>11.1f}ms "
+              f"{flood_fill_time / index_time:>7.1f}x {largest_flood_fill_time * 1000:>14.2f}ms "
+              f"{largest_index_time * 1000:>14.2f}ms")
+
+
+def bench_pool(args):
+    # Per-turn latency of the parallel AI: a new process pool every move against the session pool
+    print(f"{'turns':>6} {'depth':>6} {'pool per move':>14} {'session pool':>13}")
+    for depth in args.depths:
+        latencies = []
+        for ai_pool in (None, ai.AIWorkerPool()):
+            game = build_position(2, 2, args.seed)
+            game.is_single_simulation = True  # Take the multiprocessing path of get_ai_move
+            game.ai_pool = ai_pool
+            turn_times = []
+            for _ in range(args.moves):
+                player = game.players[game.current_player_index]
+                start_time = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    move = ai.get_ai_move(game, player, depth=depth)
+                turn_times.append(time.perf_counter() - start_time)
+                if move is None:
+                    break
+                ai.apply_move(game, player, move)
+                game.turn_order.append(player.name)
+                game.current_player_index = game.players.index(ai.get_next_player(game, player))
+            if ai_pool is not None:
+                ai_pool.close()
+            latencies.append(sum(turn_times) / len(turn_times))
+        print(f"{args.moves:>6} {depth:>6} {latencies[0] * 1000:>12.1f}ms {latencies[1] * 1000:>11.1f}ms")
+
+
+def legacy_evaluate_move_task(args):
+    # The pool task before the root position was shared: every task carries a pickled copy of the game
+    game, ai_player, move, depth, use_transposition_table, deadline, max_nodes, collapse_moves = args
+    ai_player = next(p for p in game.players if p.name == ai_player.name)
+    game.zobrist_hash = compute_zobrist_hash(game)
+    transposition_table = TranspositionTable() if use_transposition_table else None
+    budget = ai.SearchBudget(max_nodes=max_nodes, deadline=deadline)
+    statistics = ai.SearchStatistics()
+    statistics.search_depth = depth
+    # The tasks of a chunk unpickle to the same game, the move is taken back for the next one
+    undo_record = ai.apply_move(game, ai_player, move)
+    values = ai.maxn(game, depth - 1, ai_player, transposition_table, budget, collapse_moves, statistics)
+    ai.undo_move(game, undo_record)
+    return move, values, budget.nodes
+
+
+def check_parallel_search(game, player, depth, pool):
+    # get_ai_move through the worker pool has to choose the same move with the same statistics as the sequential search
+    player.score_at_turn_start = player.score  # Set at the start of every turn of a game, the paths differ without it
+    game.ai_pool = pool
+    results = []
+    for is_single_simulation in (True, False):  # Parallel first, then the sequential fallback of simulation mode
+        game.is_single_simulation = is_single_simulation
+        with contextlib.redirect_stdout(io.StringIO()):
+            move, search_statistics = ai.get_ai_move(game, player, depth=depth, return_statistics=True)
+        results.append((move, search_statistics.to_row()))
+    game.is_single_simulation = False
+    game.ai_pool = None
+    return results[0] == results[1]
+
+
+def bench_root_position(args):
+    # Bytes sent to the pool and time of one parallel turn: a pickled game per task against the shared root position
+    # The seat after the searching player is human, like in a mixed game of the GUI. Both dispatch styles and
+    # get_ai_move with and without the pool have to agree, the benchmark exits with status 1 when either does not.
+    print(f"{'players':>7} {'cards':>5} {'depth':>5} {'tasks':>5} {'pickled KB':>11} {'shared KB':>10} "
+          f"{'pickled turn':>13} {'shared turn':>12} {'same':>5} {'pool':>5}")
+    dispatch_failed = False
+    pool_failed = False
+    with ai.AIWorkerPool() as pool:
+        for num_players in (2, 4):
+            for num_turns in args.turns:
+                game = build_position(num_players, num_turns, args.seed)
+                player = game.players[game.current_player_index]
+                set_human_seat(game, (game.current_player_index + 1) % num_players)
+                cards = sum(len(p.inventory.get_all_cards()) for p in game.players)
+                for depth in args.depths:
+                    root_moves = ai.get_possible_moves(game, player)
+                    if depth == 1:
+                        root_moves = ai.collapse_equivalent_moves(game, player, root_moves)
+                    legacy_tasks = [(game, player, move, depth, True, None, None, True) for move in root_moves]
+                    legacy_bytes = sum(len(pickle.dumps(task)) for task in legacy_tasks)
+                    legacy_times = []
+                    shared_times = []
+                    for _ in range(args.moves):
+                        start_time = time.perf_counter()
+                        legacy_results = pool.map(legacy_evaluate_move_task, legacy_tasks)
+                        legacy_times.append(time.perf_counter() - start_time)
+                        # Publishing the position is part of the turn
+                        start_time = time.perf_counter()
+                        with ai.SharedRootPosition(game) as root_position:
+                            # One task per root move, the root-only split of the parallel search
+                            tasks = [
+                                (root_position.name, root_position.size, ((player.name, move, game.in_simulation),),
+                                 game.in_simulation, player.name, depth - 1, depth, True, None, None, True, False)
+                                for move in root_moves
+                            ]
+                            results = pool.map(ai.evaluate_node_multiprocess, list(enumerate(tasks)))
+                        shared_times.append(time.perf_counter() - start_time)
+                    shared_bytes = root_position.size + sum(len(pickle.dumps(task)) for task in tasks)
+                    same = [result[1][:2] for result in results] == [result[1:] for result in legacy_results]
+                    same_pool = check_parallel_search(game, player, depth, pool)
+                    dispatch_failed = dispatch_failed or not same
+                    pool_failed = pool_failed or not same_pool
+                    print(f"{num_players:>7} {cards:>5} {depth:>5} {len(tasks):>5} {legacy_bytes / 1024:>11.1f} "
+                          f"{shared_bytes / 1024:>10.1f} {statistics.median(legacy_times) * 1000:>11.1f}ms "
+                          f"{statistics.median(shared_times) * 1000:>10.1f}ms {str(same):>5} {str(same_pool):>5}")
+    if dispatch_failed:
+        print("The pickled games and the shared root position give different values, see the same column.")
+    if pool_failed:
+        print("The parallel and the sequential searches disagree, see the pool column.")
+    if dispatch_failed or pool_failed:
+        sys.exit(1)
+
+
+def get_list_schedule_time(task_times, num_workers):
+    # Time a shared task queue takes on num_workers cores: every task goes to the worker that is free first
+    worker_times = [0.0] * num_workers
+    for task_time in task_times:
+        worker_times[worker_times.index(min(worker_times))] += task_time
+    return max(worker_times)
+
+
+def bench_parallel(args):
+    # One parallel turn split only at the root against split below the root, for every number of workers
+    # Measured: wall time and CPU use (task CPU seconds / (wall time * workers)) of the turn on this machine
+    # Projected: speedup of the turn from the measured task CPU times scheduled on as many cores as workers,
+    # with the planning in the parent process as serial time. On a machine with fewer cores than workers only
+    # the projection shows the parallel speedup.
+    print(f"{os.cpu_count()} CPU cores")
+    print(f"{'turns':>5} {'depth':>5} {'split':>5} {'workers':>7} {'tasks':>5} {'wall':>9} {'cpu use':>7} "
+          f"{'projected':>9} {'speedup':>7}")
+    tasks_per_worker = ai.TASKS_PER_WORKER
+    try:
+        for num_turns in args.turns:
+            for split, split_tasks_per_worker in (('root', 0), ('deep', tasks_per_worker)):
+                ai.TASKS_PER_WORKER = split_tasks_per_worker  # 0 keeps the one task per root move
+                for num_workers in args.workers:
+                    game = build_position(2, num_turns, args.seed)
+                    game.is_single_simulation = True  # Take the multiprocessing path of get_ai_move
+                    player = game.players[game.current_player_index]
+                    with ai.AIWorkerPool(max_workers=num_workers) as pool:
+                        game.ai_pool = pool
+                        pool.map(abs, range(num_workers))  # Start the workers before the clock
+                        start_time = time.perf_counter()
+                        cpu_start_time = time.process_time()
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            _, search_statistics = ai.get_ai_move(
+                                game, player, depth=args.depth, return_statistics=True
+                            )
+                        serial_time = time.process_time() - cpu_start_time
+                        wall_time = time.perf_counter() - start_time
+                    task_times = search_statistics.task_cpu_times
+                    cpu_use = sum(task_times) / (wall_time * num_workers)
+                    projected_time = serial_time + get_list_schedule_time(task_times, num_workers)
+                    speedup = (serial_time + sum(task_times)) / projected_time
+                    print(f"{num_turns:>5} {args.depth:>5} {split:>5} {num_workers:>7} {len(task_times):>5} "
+                          f"{wall_time:>8.2f}s {cpu_use:>6.0%} {projected_time:>8.2f}s {speedup:>6.2f}x")
+    finally:
+        ai.TASKS_PER_WORKER = tasks_per_worker
+
+
+def legacy_get_possible_moves(game, player):
+    # Move generation before the frontier: scan the bounding box for every available card
+    possible_moves = []
+    inventory = player.inventory
+    min_x = min(x for x, y in inventory.grid.keys())
+    max_x = max(x for x, y in inventory.grid.keys())
+    min_y = min(y for x, y in inventory.grid.keys())
+    max_y = max(y for x, y in inventory.grid.keys())
+    for card_position in game.get_available_card_positions():
+        for x in range(min_x - 1, max_x + 2):
+            for y in range(min_y - 1, max_y + 2):
+                if inventory.get_card(x, y) is not None:
+                    continue
+                if any(inventory.get_card(ax, ay) is not None for ax, ay in [(x-1, y), (x+1, y), (x, y-1), (x, y+1)]):
+                    possible_moves.append((card_position, (x, y)))
+    return possible_moves
+
+
+def bench_move_generation(args):
+    # Cost of generating the moves of one node against the size of the inventory
+    random.seed(args.seed)
+    game = Game(1, simulation_mode=True)
+    print(f"{'cards':>6} {'moves':>6} {'bounding box scan':>18} {'frontier':>9} {'speedup':>8}")
+    failed = False
+    for num_cards in args.cards:
+        player = build_inventory(num_cards, args.seed)
+        repeats = max(1, 2000 // num_cards)
+
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            legacy_moves = legacy_get_possible_moves(game, player)
+        legacy_time = (time.perf_counter() - start_time) / repeats
+
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            moves = ai.get_possible_moves(game, player)
+        frontier_time = (time.perf_counter() - start_time) / repeats
+
+        if moves != legacy_moves:
+            print(f"WARNING: move generation differs for {num_cards} cards")
+            failed = True
+        print(f"{num_cards:>6} {len(moves):>6} {legacy_time * 1000:>16.2f}ms {frontier_time * 1000:>7.3f}ms "
+              f"{legacy_time / frontier_time:>7.1f}x")
+    if failed:
+        print("The bounding box scan and the frontier generate different moves.")
+        sys.exit(1)
+
+
+def bench_equivalence(args):
+    # Search the same positions with and without merging equivalent placements one ply above the leaves
+    print(f"{'players':>7} {'cards':>6} {'moves':>6} {'classes':>8} {'nodes':>8} {'nodes (merged)':>15} "
+          f"{'time':>8} {'time (merged)':>14} {'same move':>10}")
+    disagreements = 0
+    for num_players in (1, 2, 4):
+        for num_turns in args.turns:
+            game = build_position(num_players, num_turns, args.seed)
+            player = game.players[game.current_player_index]
+            cards = sum(len(p.inventory.grid) for p in game.players)
+            possible_moves = ai.get_possible_moves(game, player)
+            if not possible_moves:
+                continue
+            classes = len(ai.collapse_equivalent_moves(game, player, possible_moves))
+
+            results = []
+            for collapse_moves in (False, True):
+                random.seed(args.seed)
+                counter = [0]
+                with count_nodes(counter), contextlib.redirect_stdout(io.StringIO()):
+                    start_time = time.perf_counter()
+                    best_move, best_value = ai.search_root(
+                        game, player, possible_moves, args.depth, collapse_moves=collapse_moves
+                    )
+                    results.append((best_move, best_value, counter[0], time.perf_counter() - start_time))
+
+            (move, value, nodes, search_time), (merged_move, merged_value, merged_nodes, merged_time) = results
+            same_move = move == merged_move and value == merged_value
+            print(f"{num_players:>7} {cards:>6} {len(possible_moves):>6} {classes:>8} {nodes:>8} {merged_nodes:>15} "
+                  f"{search_time:>7.2f}s {merged_time:>13.2f}s {str(same_move):>10}")
+            disagreements += not same_move
+    if disagreements:
+        print(f"Merging equivalent placements changed {disagreements} searches, see the same move column.")
+        sys.exit(1)
+
+
+def legacy_find_winning_move(game, player, possible_moves):
+    # The immediate win pre-check before the token predictor: make every move on a copy of the game
+    search_game = ai.copy_game(game)
+    search_player = next(p for p in search_game.players if p.name == player.name)
+    for move in possible_moves:
+        undo_record = ai.apply_move(search_game, search_player, move)
+        is_winning_move = search_player.score >= search_game.goal
+        ai.undo_move(search_game, undo_record)
+        if is_winning_move:
+            return move
+    return None
+
+
+def find_winning_move(game, player, possible_moves):
+    for move in possible_moves:
+        card_position, (x, y) = move
+        if player.score + game.count_placement_tokens(player, game.card_board[card_position], x, y) >= game.goal:
+            return move
+    return None
+
+
+def bench_win_check(args):
+    # The immediate win pre-check of get_ai_move: copying the game and making every move against counting the
+    # tokens every move completes. The goal is set so the player needs one more token than its best move makes,
+    # so both checks go through every move, and then to exactly what the best move makes.
+    print(f"{'players':>7} {'cards':>6} {'moves':>6} {'copy + moves':>13} {'predicted':>11} {'same move':>10}")
+    for num_players in (1, 2, 4):
+        for num_turns in args.turns:
+            game = build_position(num_players, num_turns, args.seed)
+            player = game.players[game.current_player_index]
+            cards = sum(len(p.inventory.grid) for p in game.players)
+            possible_moves = ai.get_possible_moves(game, player)
+            if not possible_moves:
+                continue
+            best_tokens = max(
+                game.count_placement_tokens(player, game.card_board[card_position], x, y)
+                for card_position, (x, y) in possible_moves
+            )
+            same_move = True
+            times = [0.0, 0.0]
+            for goal in (player.score + best_tokens + 1, player.score + max(best_tokens, 1)):
+                game.goal = goal
+                game.count_end_game_state()
+                legacy_time, legacy_move = time_call(legacy_find_winning_move, game, player, possible_moves)
+                predicted_time, predicted_move = time_call(find_winning_move, game, player, possible_moves)
+                times[0] += legacy_time
+                times[1] += predicted_time
+                same_move &= legacy_move == predicted_move
+            print(f"{num_players:>7} {cards:>6} {len(possible_moves):>6} {times[0]:>11.0f}us "
+                  f"{times[1]:>9.0f}us {str(same_move):>10}")
+
+
+def legacy_next_player(game, turn_order):
+    # Next player before TurnOrder: ties were broken by scanning the whole list of turns backwards
+    least_movement = min(p.total_movement for p in game.players)
+    candidates = [p for p in game.players if p.total_movement == least_movement]
+    if len(candidates) == 1:
+        return candidates[0]
+    for player_name in reversed(turn_order):
+        if player_name in [p.name for p in candidates]:
+            return next(p for p in game.players if p.name == player_name)
+
+
+def legacy_consecutive_turns(turn_order, player):
+    count = 0
+    for player_name in reversed(turn_order):
+        if player_name != player.name:
+            break
+        count += 1
+    return count
+
+
+def legacy_is_game_over(game):
+    # is_game_over before the maintained counters: every check went over the players and the card board
+    if any(player.score >= game.goal for player in game.players):
+        return not game.in_simulation
+    return all(card is None or card == game.moon_marker for card in game.card_board) and len(game.deck) == 0
+
+
+def bench_bookkeeping(args):
+    # Choosing the next player, the consecutive turns of the Combo personality and the game-over check, once per
+    # searched node, on the list of every turn and on TurnOrder with the maintained counters. --turns is the
+    # length of the turn history, the latest turns are the ones of a mid-game position and the rest pads it.
+    steps = 1000
+    print(f"{'players':>7} {'history':>8} {'list':>9} {'maintained':>11} {'list bytes':>11} {'TurnOrder bytes':>16} {'same':>5}")
+    failed = False
+    for num_players in (2, 4):
+        game = build_position(num_players, 24, args.seed)
+        recent_turns = game.turn_order.get_history()
+        names = [player.name for player in game.players]
+        for history_length in args.turns:
+            padding = max(history_length - len(recent_turns), 0)
+            legacy_order = [names[i % num_players] for i in range(padding)] + recent_turns
+            game.turn_order = TurnOrder(legacy_order)
+
+            def legacy_step():
+                for _ in range(steps):
+                    next_player = legacy_next_player(game, legacy_order)
+                    turns = [legacy_consecutive_turns(legacy_order, player) for player in game.players]
+                    game_over = legacy_is_game_over(game)
+                return next_player.name, turns, game_over
+
+            def maintained_step():
+                for _ in range(steps):
+                    next_player = game.get_next_player()
+                    turns = [game.turn_order.get_consecutive_turns(player.name) for player in game.players]
+                    game_over = game.is_game_over()
+                return next_player.name, turns, game_over
+
+            legacy_time, legacy_result = time_call(legacy_step)
+            maintained_time, maintained_result = time_call(maintained_step)
+            same = legacy_result == maintained_result
+            failed = failed or not same
+            print(f"{num_players:>7} {len(legacy_order):>8} {legacy_time / steps:>7.2f}us {maintained_time / steps:>9.2f}us "
+                  f"{len(pickle.dumps(legacy_order)):>11} {len(pickle.dumps(game.turn_order)):>16} "
+                  f"{str(same):>5}")
+    if failed:
+        print("The turn list and TurnOrder disagree, see the same column.")
+        sys.exit(1)
+
+
+def bench_game_copy(args):
+    # Cost of creating, copying and pickling a game, the cards are shared instead of copied
+    repeats = 200
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        Game(4, simulation_mode=True)
+    init_time = (time.perf_counter() - start_time) / repeats
+    print(f"Game(4) created in {init_time * 1e6:.0f}us")
+
+    print(f"{'players':>7} {'cards':>6} {'deepcopy':>10} {'pickle':>10} {'pickled size':>13}")
+    for num_players in (1, 2, 4):
+        for num_turns in args.turns:
+            game = build_position(num_players, num_turns, args.seed)
+            cards = sum(len(p.inventory.grid) for p in game.players)
+
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                copy.deepcopy(game)
+            deepcopy_time = (time.perf_counter() - start_time) / repeats
+
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                data = pickle.dumps(game)
+            pickle_time = (time.perf_counter() - start_time) / repeats
+            print(f"{num_players:>7} {cards:>6} {deepcopy_time * 1e6:>8.0f}us {pickle_time * 1e6:>8.0f}us {len(data):>12}B")
+
+
+def build_token_inventory(game, num_cards, seed):
+    # Grow a random inventory of cards with catalog tokens, completing tokens along the way like the game does
+    # Every card gets its own id so token completion is tracked separately for each of them
+    rng = random.Random(seed)
+    player = game.players[0]
+    positions = [(0, 0)]
+    for card_number in range(num_cards):
+        x, y = positions.pop(rng.randrange(len(positions)))
+        tokens = rng.choice(CARD_CATALOG).tokens
+        card = Card(rng.choice(['red', 'green', 'blue', 'yellow']), 1, tokens, card_id=len(CARD_CATALOG) + card_number)
+        player.inventory.add_card(card, x, y)
+        game.check_placement(player, x, y)
+        for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
+            position = (x + dx, y + dy)
+            if position not in player.inventory.grid and position not in positions:
+                positions.append(position)
+    return player
+
+
+def bench_token_checks(args):
+    # Re-scanning the whole inventory against checking the cards the placement touched
+    # First make sure both find the same tokens: after every incremental check of random games a full scan must find nothing
+    # Exits with status 1 when it does
+    missed_tokens = 0
+    checked_moves = 0
+    for seed in range(args.seed, args.seed + 20):
+        game = build_position(1 + seed % 4, 0, seed)
+        while not game.is_game_over():
+            player = game.players[game.current_player_index]
+            possible_moves = ai.get_possible_moves(game, player)
+            if not possible_moves:
+                break
+            ai.apply_move(game, player, random.choice(possible_moves))
+            missed_tokens += len(game.check_inventory(player))
+            checked_moves += 1
+            game.turn_order.append(player.name)
+            game.current_player_index = game.players.index(ai.get_next_player(game, player))
+    print(f"{checked_moves} moves checked, {missed_tokens} tokens missed by the incremental check")
+    if missed_tokens:
+        sys.exit(1)
+
+    print(f"{'cards':>6} {'full scan':>10} {'incremental':>12} {'speedup':>8}")
+    for num_cards in args.cards:
+        random.seed(args.seed)
+        game = Game(1, simulation_mode=True)
+        player = build_token_inventory(game, num_cards, args.seed)
+        placement_cells = player.inventory.get_placement_cells()
+        rng = random.Random(args.seed)
+        tokens = rng.choice(CARD_CATALOG).tokens
+        cards = [
+            Card(rng.choice(['red', 'green', 'blue', 'yellow']), 1, tokens, card_id=len(CARD_CATALOG) + num_cards)
+            for _ in placement_cells
+        ]
+        timings = []
+        for check in (lambda x, y: game.check_inventory(player), lambda x, y: game.check_placement(player, x, y)):
+            start_time = time.perf_counter()
+            for card, (x, y) in zip(cards, placement_cells):
+                player.inventory.add_card(card, x, y)
+                completed_token_mask, score, players_at_goal = game.completed_token_mask, player.score, game.players_at_goal
+                check(x, y)
+                game.completed_token_mask, player.score, game.players_at_goal = completed_token_mask, score, players_at_goal
+                player.inventory.remove_card(x, y)
+            timings.append((time.perf_counter() - start_time) / len(placement_cells))
+        full_scan_time, incremental_time = timings
+        print(f"{num_cards:>6} {full_scan_time * 1000:>8.3f}ms {incremental_time * 1000:>10.3f}ms "
+              f"{full_scan_time / incremental_time:>7.1f}x")
+
+
+def token_satisfied(token, counts):
+    # The color by color comparison the token checks did before the lookup table
+    for color, required_count in zip(COLORS, token.requirements):
+        if required_count and counts[color] < required_count:
+            return False
+    return True
+
+
+def bench_token_table(args):
+    # Check the lookup table against the direct comparison for every token and every count vector,
+    # counts go past the cap to make sure capping changes nothing, exits with status 1 on any mismatch
+    tokens = [Token(*requirements) for requirements in TOKEN_REQUIREMENTS]
+    tokens += [token for card in CARD_CATALOG for token in card.tokens]
+    mismatches = 0
+    checked = 0
+    for count_vector in itertools.product(range(7), repeat=len(COLORS)):
+        counts = dict(zip(COLORS, count_vector))
+        satisfied_tokens = SATISFIED_TOKENS[get_count_state(*count_vector)]
+        for token in tokens:
+            checked += 1
+            if bool(satisfied_tokens & token.token_bit) != token_satisfied(token, counts):
+                mismatches += 1
+    print(f"{checked} token/count combinations checked, {mismatches} mismatches")
+    if mismatches:
+        sys.exit(1)
+
+    # Time the checks of every card in the catalog against random counts
+    rng = random.Random(args.seed)
+    count_vectors = [tuple(rng.randrange(7) for _ in COLORS) for _ in range(2000)]
+    cards = [card for card in CARD_CATALOG if card.tokens]
+    start_time = time.perf_counter()
+    for count_vector in count_vectors:
+        counts = dict(zip(COLORS, count_vector))
+        for card in cards:
+            for token in card.tokens:
+                token_satisfied(token, counts)
+    compare_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for count_vector in count_vectors:
+        satisfied_tokens = SATISFIED_TOKENS[get_count_state(*count_vector)]
+        for card in cards:
+            for token in card.tokens:
+                satisfied_tokens & token.token_bit
+    table_time = time.perf_counter() - start_time
+    checks = len(count_vectors) * sum(len(card.tokens) for card in cards)
+    print(f"per token check: compare colors {compare_time / checks * 1e9:.0f}ns, "
+          f"table lookup {table_time / checks * 1e9:.0f}ns ({compare_time / table_time:.1f}x)")
+
+
+def bench_inventory_engines(args):
+    # The operations the game and the AI use, timed on the dict and the bitboard inventory holding the same cards
+    operations = [
+        ('place+remove', lambda inventory, cells: [
+            (inventory.add_card(placed_card, x, y), inventory.remove_card(x, y)) for x, y in cells
+        ]),
+        ('color counts', lambda inventory, cells: [
+            inventory.get_adjacent_region_size(x, y, color) for x, y in cells for color in ['red', 'green', 'blue', 'yellow']
+        ]),
+        ('largest regions', lambda inventory, cells: inventory.get_largest_regions()),
+        ('placement cells', lambda inventory, cells: inventory.get_placement_cells()),
+        ('copy', lambda inventory, cells: inventory.copy()),
+    ]
+    placed_card = Card('red', 1, [])
+    print(f"{'cards':>6} {'operation':>16} {'dict':>10} {'bitboard':>10} {'speedup':>8}")
+    for num_cards in args.cards:
+        inventories = [build_inventory(num_cards, args.seed, engine).inventory for engine in ('dict', 'bitboard')]
+        cells = inventories[0].get_placement_cells()
+        repeats = max(1, 4000 // num_cards)
+        for name, operation in operations:
+            timings = []
+            for inventory in inventories:
+                start_time = time.perf_counter()
+                for _ in range(repeats):
+                    operation(inventory, cells)
+                timings.append((time.perf_counter() - start_time) / repeats)
+            dict_time, bitboard_time = timings
+            print(f"{num_cards:>6} {name:>16} {dict_time * 1e6:>8.0f}us {bitboard_time * 1e6:>8.0f}us "
+                  f"{dict_time / bitboard_time:>7.2f}x")
+
+    # Whole searches on the same position with either engine
+    print(f"{'players':>7} {'cards':>6} {'dict n/s':>9} {'bitboard n/s':>13}")
+    for num_players in (2, 4):
+        rates = []
+        for engine in ('dict', 'bitboard'):
+            random.seed(args.seed)
+            game = Game(num_players, goal=100, simulation_mode=True, inventory_engine=engine)
+            for _ in range(12):
+                player = game.players[game.current_player_index]
+                ai.apply_move(game, player, random.choice(ai.get_possible_moves(game, player)))
+                game.turn_order.append(player.name)
+                game.current_player_index = game.players.index(ai.get_next_player(game, player))
+            player = game.players[game.current_player_index]
+            counter = [0]
+            with count_nodes(counter):
+                start_time = time.perf_counter()
+                ai.maxn(game, args.depth, player)
+                rates.append(counter[0] / (time.perf_counter() - start_time))
+        cards = sum(len(p.inventory.grid) for p in game.players)
+        print(f"{num_players:>7} {cards:>6} {rates[0]:>9.0f} {rates[1]:>13.0f}")
+
+
+def bench_cold_start(args):
+    # Time a fresh interpreter importing the headless runner, against the GUI module
+    # Worker processes and every `python -m simulation` run pay this once
+    print(f"{'module':>10} {'median':>9} {'min':>9} {'tkinter loaded':>15}")
+    for module in ('simulation', 'gui'):
+        code = f"import sys, {module}; print('tkinter' in sys.modules)"
+        timings = []
+        for _ in range(args.moves):
+            start_time = time.perf_counter()
+            result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+            timings.append(time.perf_counter() - start_time)
+        if result.returncode != 0:
+            print(f"{module:>10} failed to import: {result.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{module:>10} {statistics.median(timings) * 1000:>7.0f}ms {min(timings) * 1000:>7.0f}ms "
+              f"{result.stdout.strip():>15}")
+
+
+def play_timed_game(num_players, depth, seed, game_number, time_phases):
+    # Play one headless game, returns it and its wall time
+    game = Game(num_players, goal=10, simulation_mode=True, game_number=game_number,
+                rng=create_game_rng(seed, game_number), time_phases=time_phases)
+    for player in game.players:
+        player.is_ai = True
+        player.ai_personality = 'Balanced'
+        player.set_search_settings(search_depth=depth)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_time = time.perf_counter()
+        game.simulate_game()
+    return game, time.perf_counter() - start_time
+
+
+def bench_phases(args):
+    # Where the time of the AI turns goes, and what timing the phases costs
+    # Every game is played once without and once with the phase timer, args.moves games per player count
+    for num_players in (2, 4):
+        untimed = 0.0
+        timed = 0.0
+        game_times = dict.fromkeys(PHASES, 0.0)
+        game_calls = dict.fromkeys(PHASES, 0)
+        for game_number in range(1, args.moves + 1):
+            untimed += play_timed_game(num_players, args.depth, args.seed, game_number, False)[1]
+            game, elapsed = play_timed_game(num_players, args.depth, args.seed, game_number, True)
+            timed += elapsed
+            for phase in PHASES:
+                game_times[phase] += game.phase_timer.game_times[phase]
+                game_calls[phase] += game.phase_timer.game_calls[phase]
+        print(f"{num_players} players, {args.moves} games: {untimed:.2f}s untimed, {timed:.2f}s timed "
+              f"({(timed / untimed - 1) * 100:+.1f}%)")
+        print(f"{'phase':>16} {'calls':>9} {'time':>8} {'share':>6} {'per call':>9}")
+        for phase in PHASES:
+            calls = game_calls[phase]
+            per_call = game_times[phase] / calls * 1e6 if calls else 0
+            print(f"{phase:>16} {calls:>9} {game_times[phase]:>7.2f}s {game_times[phase] / timed * 100:>5.1f}% "
+                  f"{per_call:>7.1f}us")
+
+
+def time_call(function, *args):
+    # Fastest of a few runs of function(*args) in microseconds, and its result
+    timings = []
+    for _ in range(20):
+        start_time = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings) * 1e6, result
+
+
+def check_snapshot_round_trip(game, seed):
+    # The restored game has to encode to the same bytes, search to the same result and play on the same way
+    restored = Game.from_bytes(game.to_bytes())
+    if restored.to_bytes() != game.to_bytes():
+        return "bytes differ"
+    player = game.players[game.current_player_index]
+    restored_player = restored.players[restored.current_player_index]
+    with contextlib.redirect_stdout(io.StringIO()):
+        move, search_statistics = ai.get_ai_move(game, player, depth=2, return_statistics=True)
+        restored_move, restored_statistics = ai.get_ai_move(restored, restored_player, depth=2, return_statistics=True)
+    if (move, search_statistics.to_row()) != (restored_move, restored_statistics.to_row()):
+        return "search differs"
+    rng = random.Random(seed)
+    for _ in range(12):
+        player = game.players[game.current_player_index]
+        possible_moves = ai.get_possible_moves(game, player)
+        if not possible_moves or game.is_game_over():
+            break
+        move = rng.choice(possible_moves)
+        restored_player = restored.players[game.current_player_index]
+        for played_game, played_player in ((game, player), (restored, restored_player)):
+            ai.apply_move(played_game, played_player, move)
+            played_game.turn_order.append(played_player.name)
+            played_game.current_player_index = played_game.players.index(ai.get_next_player(played_game, played_player))
+        if restored.to_bytes() != game.to_bytes():
+            return "play differs"
+    return "ok"
+
+
+def bench_snapshot(args):
+    # Size and speed of Game.to_bytes / Game.from_bytes against pickling the whole game, with a round trip check
+    # Games with more than one player are checked again with a human seat, the second result of the column
+    # Exits with status 1 when a round trip fails
+    print(f"{'players':>7} {'cards':>5} {'pickle B':>9} {'snapshot B':>11} {'dumps us':>9} {'loads us':>9} "
+          f"{'to_bytes us':>12} {'from_bytes us':>14}  round trip")
+    failed = False
+    for num_players in (1, 2, 4):
+        for num_turns in args.turns:
+            game = build_position(num_players, num_turns, args.seed)
+            cards = sum(len(p.inventory.get_all_cards()) for p in game.players)
+            dumps_time, pickled = time_call(pickle.dumps, game)
+            loads_time, _ = time_call(pickle.loads, pickled)
+            to_bytes_time, snapshot = time_call(game.to_bytes)
+            from_bytes_time, _ = time_call(Game.from_bytes, snapshot)
+            round_trips = [check_snapshot_round_trip(game, args.seed)]
+            if num_players > 1:
+                human_game = build_position(num_players, num_turns, args.seed)
+                set_human_seat(human_game)
+                round_trips.append(check_snapshot_round_trip(human_game, args.seed))
+            failed = failed or any(round_trip != 'ok' for round_trip in round_trips)
+            print(f"{num_players:>7} {cards:>5} {len(pickled):>9} {len(snapshot):>11} {dumps_time:>9.0f} "
+                  f"{loads_time:>9.0f} {to_bytes_time:>12.0f} {from_bytes_time:>14.0f}  {', '.join(round_trips)}")
+    if failed:
+        print("Snapshot round trips failed, see the round trip column.")
+        sys.exit(1)
+
+
+def set_human_seat(game, seat=0):
+    # Makes a seat human the way gui.py start_game does: no AI and no personality
+    game.players[seat].is_ai = False
+    game.players[seat].ai_personality = None
+
+
+# Frozen positions of the suite: name -> (players, random moves played from the seeded start, deepest depth searched)
+# The deepest depth keeps every case within about a minute, the searches grow ~30x per ply
+# opening-1p at depth 5 and the 1 player positions at depth 3-4 match the runs in Statistics_data/1 Player AI*
+SUITE_POSITIONS = {
+    'opening-1p': (1, 0, 5),
+    'early-1p': (1, 4, 4),
+    'mid-1p': (1, 16, 3),
+    'huge-1p': (1, 40, 2),
+    'mid-2p': (2, 12, 3),
+    'mid-3p': (3, 24, 3),
+    'late-4p': (4, 24, 3),
+    'huge-4p': (4, 40, 3),
+}
+SUITE_SEED = 1  # Never change it, the baselines are only comparable on the same positions
+SUITE_BASELINE = 'benchmark_baseline.json'
+SUITE_MIN_TIME = 0.5  # Quick cases are searched again until this much time passed, the fastest search counts
+
+
+def get_position_fingerprint(game):
+    # Identifies a suite position, a position built differently than when the baseline was saved is not comparable
+    state = (
+        [sorted((x, y, card.card_id) for card, x, y in player.inventory.get_all_cards()) for player in game.players],
+        [getattr(card, 'card_id', card) for card in game.card_board],
+        [card.card_id for card in game.deck],
+        game.current_player_index,
+    )
+    return hashlib.sha1(repr(state).encode()).hexdigest()[:16]
+
+
+def run_suite_case(position_name, depth):
+    # Runs in a fresh process so the peak RSS is the one of this search only
+    logging.getLogger().setLevel(logging.WARNING)
+    sys.setrecursionlimit(10000)
+    num_players, num_turns, _ = SUITE_POSITIONS[position_name]
+    game = build_position(num_players, num_turns, SUITE_SEED)
+    player = game.players[game.current_player_index]
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        while sum(timings) < SUITE_MIN_TIME:
+            counter = [0]  # get_ai_move searches a copy, every run starts from the same position
+            with count_nodes(counter):
+                start_time = time.perf_counter()
+                move = ai.get_ai_move(game, player, depth=depth)
+                timings.append(time.perf_counter() - start_time)
+    time_to_move = min(timings)
+    return {
+        'fingerprint': get_position_fingerprint(game),
+        'cards': sum(len(p.inventory.get_all_cards()) for p in game.players),
+        'move': str(move),
+        'nodes': counter[0],
+        'nodes_per_second': counter[0] / time_to_move,
+        'time_to_move': time_to_move,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+    }
+
+
+def compare_suite_case(result, baseline, tolerance):
+    # Problems of a case against its baseline, the upper case ones fail the suite
+    # The move, the nodes count and the position only change when the code changed, so they are compared exactly.
+    # Time and memory depend on the machine the baseline was saved on, they are only reported.
+    if baseline is None:
+        return ['no baseline']
+    if result['fingerprint'] != baseline['fingerprint']:
+        return ['POSITION CHANGED']
+    problems = []
+    if result['move'] != baseline['move']:
+        problems.append('MOVE CHANGED')
+    if result['nodes'] != baseline['nodes']:
+        problems.append('NODES CHANGED')
+    if result['time_to_move'] > baseline['time_to_move'] * (1 + tolerance):
+        problems.append('slower')
+    if result['peak_rss_kb'] and baseline['peak_rss_kb'] and result['peak_rss_kb'] > baseline['peak_rss_kb'] * (1 + tolerance):
+        problems.append('more memory')
+    return problems
+
+
+def bench_suite(args):
+    # get_ai_move on the frozen positions at every depth up to each position's deepest (and args.max_depth)
+    # Exits with status 1 when a move, a nodes count or a position changed, slower or bigger cases are only reported
+    try:
+        with open(args.baseline) as baseline_file:
+            baselines = json.load(baseline_file)['cases']
+    except FileNotFoundError:
+        baselines = {}
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    failed = False
+    print(f"{'position':>10} {'depth':>5} {'cards':>5} {'nodes':>9} {'nodes/s':>8} {'time':>9} {'peak RSS':>9} "
+          f"{'vs base':>8}  status")
+    for position_name, (_, _, max_depth) in SUITE_POSITIONS.items():
+        for depth in range(1, min(max_depth, args.max_depth) + 1):
+            with context.Pool(1) as pool:
+                result = pool.apply(run_suite_case, (position_name, depth))
+            case = f'{position_name}/{depth}'
+            results[case] = result
+            baseline = baselines.get(case)
+            problems = compare_suite_case(result, baseline, args.tolerance)
+            failed = failed or any(problem.isupper() for problem in problems)
+            change = f"{(result['time_to_move'] / baseline['time_to_move'] - 1) * 100:+7.1f}%" if baseline else ''
+            rss = f"{result['peak_rss_kb'] / 1024:.0f}MB" if result['peak_rss_kb'] else '-'
+            print(f"{position_name:>10} {depth:>5} {result['cards']:>5} {result['nodes']:>9} "
+                  f"{result['nodes_per_second']:>8.0f} {result['time_to_move']:>8.3f}s {rss:>9} {change:>8}  "
+                  f"{', '.join(problems) or 'ok'}", flush=True)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({
+                'machine': f"{platform.machine()} {platform.processor() or platform.system()}",
+                'python': platform.python_version(),
+                'cases': results,
+            }, baseline_file, indent=1)
+        print(f"Baseline saved to {args.baseline}.")
+    elif failed:
+        print("Changed results, see the status column.")
+        sys.exit(1)
+
+
+BENCHMARKS = {
+    'make-unmake': bench_make_unmake,
+    'trace': bench_trace,
+    'transposition': bench_transposition,
+    'regions': bench_regions,
+    'pool': bench_pool,
+    'root-position': bench_root_position,
+    'parallel': bench_parallel,
+    'move-generation': bench_move_generation,
+    'equivalence': bench_equivalence,
+    'win-check': bench_win_check,
+    'bookkeeping': bench_bookkeeping,
+    'game-copy': bench_game_copy,
+    'token-checks': bench_token_checks,
+    'token-table': bench_token_table,
+    'inventory-engines': bench_inventory_engines,
+    'cold-start': bench_cold_start,
+    'phases': bench_phases,
+    'snapshot': bench_snapshot,
+    'suite': bench_suite,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nova Luna AI benchmarks")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--turns', type=int, nargs='+', default=[4, 12, 24])
+    parser.add_argument('--cards', type=int, nargs='+', default=[25, 50, 100, 200, 400])
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--moves', type=int, default=10)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--max-depth', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Slowdown of a suite case that is reported, 0.25 is 25%%")
+    parser.add_argument('--baseline', default=SUITE_BASELINE, help="Baseline file of the suite")
+    parser.add_argument('--save-baseline', action='store_true', help="Record the suite results as the new baseline")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
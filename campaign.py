@@ -0,0 +1,258 @@
+import argparse
+import collections
+import json
+import logging
+import os
+import random
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+from simulation import SimulationResultWriter, add_game_arguments, get_player_settings, run_single_simulation
+
+# Simulation campaigns spread over any number of worker processes and hosts
+# The coordinator hands out game numbers over TCP, workers play them with run_single_simulation and send the rows back.
+# Games of a worker that disconnects go back to the queue. Messages are one JSON object per line.
+# The coordinator only listens on 127.0.0.1 unless --host says otherwise, the protocol has no authentication.
+#   python -m campaign coordinator --games 100000 --seed 7 --host 0.0.0.0 --port 5555 --outdir results
+#   python -m campaign worker --host coordinator-host --port 5555      (on every worker host, as many as wanted)
+# Or, on one machine:
+#   python -m campaign coordinator --games 1000 --seed 7 --local-workers 4
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 30  # Seconds a worker keeps trying to reach the coordinator
+WORKER_CHECK_INTERVAL = 1  # Seconds between the coordinator's checks that its local workers are still running
+
+
+def send_message(stream, message):
+    stream.write(json.dumps(message) + '\n')
+    stream.flush()
+
+
+def receive_message(stream):
+    # Returns None once the other side closed the connection
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+class CampaignCoordinator:
+    # Keeps the queue of games still to play, the games each worker is playing and writes the results as they arrive
+
+    def __init__(self, campaign, game_numbers, output_dir='.', fsync_every=100, host='127.0.0.1', port=0):
+        self.campaign = campaign  # run_single_simulation arguments shared by every game
+        self.pending = collections.deque(game_numbers)
+        self.total_games = len(self.pending)
+        self.completed = set()
+        self.connected_workers = 0
+        self.condition = threading.Condition()
+        self.result_writer = SimulationResultWriter(output_dir, fsync_every, campaign['time_phases'])
+        self.server = socketserver.ThreadingTCPServer((host, port), CampaignRequestHandler, bind_and_activate=False)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.server.coordinator = self
+
+    @property
+    def address(self):
+        return self.server.server_address
+
+    def is_finished(self):
+        return len(self.completed) == self.total_games
+
+    def next_game(self, assigned):
+        # Blocks while every remaining game is being played, one of them comes back if its worker dies
+        with self.condition:
+            while not self.pending and not self.is_finished():
+                self.condition.wait()
+            if self.is_finished():
+                return None
+            game_number = self.pending.popleft()
+            assigned.add(game_number)
+            return game_number
+
+    def complete_game(self, game_number, player_data, turn_data, assigned):
+        with self.condition:
+            assigned.discard(game_number)
+            if game_number in self.completed:
+                return
+            self.completed.add(game_number)
+            self.result_writer.write_game(player_data, turn_data)
+            print(f"Simulation {len(self.completed)}/{self.total_games} complete")
+            self.condition.notify_all()
+
+    def requeue_games(self, assigned, worker_address):
+        # The worker is gone, its unfinished games are played by someone else
+        with self.condition:
+            unfinished = sorted(game_number for game_number in assigned if game_number not in self.completed)
+            if unfinished:
+                logger.warning(f"Worker {worker_address} disconnected, requeueing games {unfinished}")
+                self.pending.extendleft(reversed(unfinished))
+            assigned.clear()
+            self.condition.notify_all()
+
+    def connect_worker(self):
+        with self.condition:
+            self.connected_workers += 1
+
+    def disconnect_worker(self):
+        with self.condition:
+            self.connected_workers -= 1
+            self.condition.notify_all()
+
+    def run(self, local_workers=()):
+        # Serve workers until every game is done, then close the results
+        # With local worker processes it gives up once all of them exited and no other worker is connected,
+        # e.g. when they could not start, instead of waiting for workers that never come
+        server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        server_thread.start()
+        try:
+            with self.condition:
+                while not self.is_finished():
+                    self.condition.wait(WORKER_CHECK_INTERVAL if local_workers else None)
+                    if (local_workers and not self.connected_workers and not self.is_finished()
+                            and all(worker.poll() is not None for worker in local_workers)):
+                        raise RuntimeError(
+                            f"All local workers exited with {self.total_games - len(self.completed)} games left, "
+                            f"exit codes {[worker.returncode for worker in local_workers]}"
+                        )
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+            self.result_writer.close()
+
+
+class CampaignRequestHandler(socketserver.BaseRequestHandler):
+    # One connected worker
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        # Notice workers on hosts that went away without closing the connection
+        self.request.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        stream = self.request.makefile('rw')
+        assigned = set()
+        coordinator.connect_worker()
+        try:
+            send_message(stream, {'type': 'campaign', **coordinator.campaign})
+            while True:
+                message = receive_message(stream)
+                if message is None:
+                    break
+                if message['type'] == 'result':
+                    coordinator.complete_game(message['game_number'], message['player_data'], message['turn_data'], assigned)
+                elif message['type'] == 'request':
+                    game_number = coordinator.next_game(assigned)
+                    if game_number is None:
+                        send_message(stream, {'type': 'done'})
+                        break
+                    send_message(stream, {'type': 'game', 'game_number': game_number})
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logger.warning(f"Lost worker {self.client_address}: {error}")
+        finally:
+            coordinator.requeue_games(assigned, self.client_address)
+            coordinator.disconnect_worker()
+            stream.close()
+
+
+def connect_to_coordinator(host, port, timeout=CONNECT_TIMEOUT):
+    # Workers may start before the coordinator listens, keep trying for a while
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return socket.create_connection((host, port))
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def run_worker(host, port):
+    # Play the games the coordinator hands out until it has none left, returns the number of games played
+    games_played = 0
+    with connect_to_coordinator(host, port) as connection, connection.makefile('rw') as stream:
+        campaign = receive_message(stream)
+        while campaign is not None:
+            send_message(stream, {'type': 'request'})
+            message = receive_message(stream)
+            if message is None or message['type'] == 'done':
+                break
+            game_number = message['game_number']
+            player_data, turn_data = run_single_simulation(
+                game_number, campaign['num_players'], campaign['goal'], campaign['ai_personalities'], False,
+                campaign['search_settings'], campaign['seed'], campaign['time_phases']
+            )
+            send_message(stream, {
+                'type': 'result', 'game_number': game_number, 'player_data': player_data, 'turn_data': turn_data
+            })
+            games_played += 1
+    return games_played
+
+
+def start_local_workers(count, host, port):
+    # Worker processes on this machine, the same program a remote host would run
+    # They start in this file's directory so `-m campaign` is found wherever the coordinator was started from
+    return [
+        subprocess.Popen(
+            [sys.executable, '-m', 'campaign', 'worker', '--host', host, '--port', str(port)],
+            stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        for _ in range(count)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a Nova Luna simulation campaign on many workers")
+    subparsers = parser.add_subparsers(dest='role', required=True)
+    coordinator_parser = subparsers.add_parser('coordinator', help="Hand out the games and collect the results")
+    add_game_arguments(coordinator_parser)
+    coordinator_parser.add_argument(
+        '--host', default='127.0.0.1', help="Address to listen on, 0.0.0.0 to accept workers from other machines"
+    )
+    coordinator_parser.add_argument('--port', type=int, default=5555)
+    coordinator_parser.add_argument('--local-workers', type=int, default=0, help="Worker processes to start on this machine")
+    worker_parser = subparsers.add_parser('worker', help="Play games for a coordinator")
+    worker_parser.add_argument('--host', default='127.0.0.1', help="Address of the coordinator")
+    worker_parser.add_argument('--port', type=int, default=5555)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.role == 'worker':
+        games_played = run_worker(args.host, args.port)
+        print(f"Worker done after {games_played} games.")
+        return
+
+    ai_personalities, search_settings = get_player_settings(coordinator_parser, args)
+    seed = args.seed
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+        print(f"Campaign seed {seed}, pass --seed {seed} to play these games again")
+    campaign = {
+        'num_players': args.players,
+        'goal': args.goal,
+        'ai_personalities': ai_personalities,
+        'search_settings': search_settings,
+        'seed': seed,
+        'time_phases': args.time_phases,
+    }
+    coordinator = CampaignCoordinator(
+        campaign, range(1, args.games + 1), args.outdir, args.fsync_every, args.host, args.port
+    )
+    host, port = coordinator.address
+    print(f"Coordinator listening on {host}:{port}")
+    local_workers = start_local_workers(args.local_workers, '127.0.0.1', port)
+    try:
+        coordinator.run(local_workers)
+    finally:
+        for worker in local_workers:
+            worker.wait()
+    print(f"Campaign complete. Data saved to simulations.csv and thinking_times.csv in {args.outdir}.")
+
+
+if __name__ == "__main__":
+    main()
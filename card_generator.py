@@ -82,14 +82,26 @@ CARD_DATA = [
     {"color": "yellow", "movement": 7, "tokens": [get_token_with_colors(red_count=1, green_count=1), get_token_with_colors(blue_count=1, green_count=1), get_token_with_colors(red_count=1, blue_count=1)]}  
 ]
 
-def generate_cards(card_data):
-    deck = []
-    for card_info in card_data:
-        card = Card(
+def build_card_catalog(card_data):
+    # One immutable card per entry of the card data, the card id is the index of the entry
+    return tuple(
+        Card(
             color=card_info["color"],
             movement=card_info["movement"],
-            tokens=card_info["tokens"]
+            tokens=card_info["tokens"],
+            card_id=card_id
         )
+        for card_id, card_info in enumerate(card_data)
+    )
+
+# Built once, every game deals these same cards
+CARD_CATALOG = build_card_catalog(CARD_DATA)
+
+def generate_cards(card_catalog=CARD_CATALOG, rng=None):
+    # Shuffles with the game's random generator when given one
+    rng = rng or random
+    deck = []
+    for card in card_catalog:
         deck.append(card)
-        random.shuffle(deck)
+        rng.shuffle(deck)
     return deck
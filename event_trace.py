@@ -0,0 +1,103 @@
+import struct
+import time
+
+# Structured trace of what happens in a game: moves, completed tokens, deals and AI turns
+# A game traces only when game.event_trace is set, the traced code just checks it for None, like the phase timer:
+#   trace = game.event_trace
+#   if trace is not None:
+#       trace.record(MOVE_APPLIED, player_index, card_id, x, y)
+# Records go to an in-memory ring buffer that keeps the latest capacity records, or to a binary trace file.
+# A trace file is a header followed by RECORD_FORMAT records, read_trace_file reads it back.
+
+MOVE_APPLIED = 1  # card id, x, y
+TOKEN_COMPLETED = 2  # card id, token index, new score
+DEAL = 3  # cards dealt, cards left in the deck
+TURN_START = 4  # score, total movement
+TURN_END = 5  # score, total movement, card id taken or -1
+EVENT_NAMES = {
+    MOVE_APPLIED: 'move_applied',
+    TOKEN_COMPLETED: 'token_completed',
+    DEAL: 'deal',
+    TURN_START: 'turn_start',
+    TURN_END: 'turn_end',
+}
+
+FLAG_SEARCH = 1  # Recorded while the AI searched, the event is taken back again
+NO_PLAYER = 255
+
+MAGIC = b'NLT'
+VERSION = 1
+# perf_counter time, event, flags, player index, turn number, three event arguments
+RECORD_FORMAT = struct.Struct('<dBBBHhhh')
+FLUSH_EVERY = 4096  # Records buffered before they are written to the trace file
+
+
+class EventTrace:
+    # Collects the records of a game, set as game.event_trace to turn tracing on
+
+    def __init__(self, capacity=65536, path=None):
+        self.capacity = capacity
+        self.records = []  # Ring buffer, records[next_index] is the oldest once it is full
+        self.next_index = 0
+        self.recorded = 0  # Records since the trace started, also the ones the ring buffer dropped
+        self.turn_number = 0  # Turn of the records, set by the game at every turn start
+        self.file = None
+        self.pending = []
+        if path is not None:
+            self.file = open(path, 'wb')
+            self.file.write(MAGIC + bytes([VERSION]))
+
+    def record(self, event, player_index=NO_PLAYER, a=0, b=0, c=0, search=False):
+        entry = (time.perf_counter(), event, FLAG_SEARCH if search else 0, player_index, self.turn_number, a, b, c)
+        self.recorded += 1
+        if self.file is not None:
+            self.pending.append(entry)
+            if len(self.pending) >= FLUSH_EVERY:
+                self.flush()
+            return
+        if len(self.records) < self.capacity:
+            self.records.append(entry)
+        else:
+            self.records[self.next_index] = entry
+            self.next_index = (self.next_index + 1) % self.capacity
+
+    def get_records(self):
+        # Records of the ring buffer, oldest first
+        return self.records[self.next_index:] + self.records[:self.next_index]
+
+    def flush(self):
+        if self.file is not None and self.pending:
+            self.file.write(b''.join(RECORD_FORMAT.pack(*entry) for entry in self.pending))
+            self.file.flush()
+            self.pending = []
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_trace_file(path):
+    # Yields the records of a trace file as (time, event, flags, player index, turn number, a, b, c)
+    with open(path, 'rb') as trace_file:
+        header = trace_file.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an event trace")
+        if header[len(MAGIC)] != VERSION:
+            raise ValueError(f"Event trace version {header[len(MAGIC)]} is not supported, expected {VERSION}")
+        data = trace_file.read()
+    yield from RECORD_FORMAT.iter_unpack(data)
+
+
+def format_record(entry):
+    event_time, event, flags, player_index, turn_number, a, b, c = entry
+    player = '-' if player_index == NO_PLAYER else player_index + 1
+    search = ' search' if flags & FLAG_SEARCH else ''
+    return f"{event_time:.6f} turn {turn_number} player {player} {EVENT_NAMES.get(event, event)}{search} {a} {b} {c}"
@@ -1,20 +1,121 @@
 import random
 from Player import Player
-from card_generator import generate_cards, CARD_DATA
-import tkinter as tk
+from card_generator import generate_cards
+from Card import MAX_TOKENS
+from Token import COLORS, SATISFIED_TOKENS, get_count_state
+from Inventory import DIRECTIONS
 from ai import get_ai_move, get_possible_moves
+from transposition import zobrist_move_delta
+from phase_timer import PhaseTimer
+from event_trace import DEAL, MOVE_APPLIED, TOKEN_COMPLETED, TURN_END, TURN_START
 import threading
 import logging
 import time
 
 logger = logging.getLogger(__name__)
 
+def create_game_rng(campaign_seed, game_number):
+    # The random generator of one game of a seeded campaign, the same seed and game number always play the same game
+    return random.Random(f"{campaign_seed}-{game_number}")
+
+def new_statistics(players):
+    # The statistics a game collects about its players
+    return {
+        'moves_per_player': {player.name: [] for player in players},
+        'turn_times': {player.name: [] for player in players},
+        'game_length': 0,
+        'winner': None,
+        'move_costs': {player.name: [] for player in players},
+        'scores_per_turn': {player.name: [] for player in players},
+        'per_turn_data': []
+    }
+
+def collect_placed_region(inventory, start, color, placed, exclude_position=None):
+    # Positions of the region of the given color around start as if a card of that color was placed at placed
+    visited = {start}
+    stack = [start]
+    while stack:
+        cx, cy = stack.pop()
+        for dx, dy in DIRECTIONS:
+            position = (cx + dx, cy + dy)
+            if position == exclude_position or position in visited:
+                continue
+            neighbor_card = inventory.get_card(*position)
+            if position == placed or (neighbor_card is not None and neighbor_card.color == color):
+                visited.add(position)
+                stack.append(position)
+    return visited
+
+def count_placed_color(inventory, x, y, card, placed, color, placed_region):
+    # Inventory.get_adjacent_region_size of the card at (x, y) for the color of a card placed at placed,
+    # placed_region is the region that card joins. Every neighbour adds the size of its own region.
+    neighbors = []
+    for dx, dy in DIRECTIONS:
+        position = (x + dx, y + dy)
+        neighbor_card = inventory.get_card(*position)
+        if position == placed or (neighbor_card is not None and neighbor_card.color == color):
+            neighbors.append(position)
+    if card.color != color:
+        # (x, y) is not part of these regions, only the joined one grew
+        return sum(
+            len(placed_region) if neighbor in placed_region else inventory.get_region_size(*neighbor)
+            for neighbor in neighbors
+        )
+    if len(neighbors) == 1:
+        return len(placed_region) - 1
+    # (x, y) may be the only link between its neighbours, count the region with it left out
+    total = 0
+    sizes = {}
+    for neighbor in neighbors:
+        if neighbor not in sizes:
+            visited = collect_placed_region(inventory, neighbor, color, placed, (x, y))
+            for position in visited:
+                sizes[position] = len(visited)
+        total += sizes[neighbor]
+    return total
+
+class TurnOrder:
+    # The order the turns were taken in, keeping only what the tie-breaks ask about instead of every turn:
+    # the turn each player took last and how many turns in a row the last player took
+    def __init__(self, names=()):
+        self.turns = 0
+        self.last_turns = {}  # Player name -> number of their latest turn
+        self.last_name = None
+        self.consecutive_turns = 0
+        for name in names:
+            self.append(name)
+
+    def append(self, name):
+        self.turns += 1
+        self.last_turns[name] = self.turns
+        if name == self.last_name:
+            self.consecutive_turns += 1
+        else:
+            self.last_name = name
+            self.consecutive_turns = 1
+
+    def get_consecutive_turns(self, name):
+        # Turns the player took in a row at the end of the order
+        return self.consecutive_turns if name == self.last_name else 0
+
+    def get_history(self):
+        # Shortest order of names that answers the same when appended to a new TurnOrder, used by snapshots
+        names = sorted(self.last_turns, key=self.last_turns.get)
+        return names + [self.last_name] * (self.consecutive_turns - 1)
+
 class Game:
-    def __init__(self, num_players, goal=10, gui=None, simulation_mode=False, is_single_simulation=False, game_number=1):
+    def __init__(self, num_players, goal=10, gui=None, simulation_mode=False, is_single_simulation=False, game_number=1, ai_pool=None, inventory_engine='dict', rng=None, time_phases=False, event_trace=None):
         # Initialize Game
+        # Every random decision of the game comes from its own generator, see create_game_rng
+        # Without one the generator is seeded from the global random module
+        self.rng = rng if rng is not None else random.Random(random.getrandbits(64))
         colors = ['white', 'orange', 'pink', 'teal']
-        self.players = [Player(colors[i], f'Player{i+1}', is_ai=(i != 0)) for i in range(num_players)]
-        self.deck = generate_cards(CARD_DATA)
+        self.inventory_engine = inventory_engine  # Key of Player.INVENTORY_ENGINES
+        self.players = [
+            Player(colors[i], f'Player{i+1}', is_ai=(i != 0), inventory_engine=inventory_engine) for i in range(num_players)
+        ]
+        self.deck = generate_cards(rng=self.rng)
+        self.completed_token_mask = 0  # Bit card_id * MAX_TOKENS + token_index is set once that token is completed
         self.goal = goal  # Goal score
         self.current_player_index = 0
         self.board = [[] for _ in range(24)]
@@ -25,44 +126,60 @@ class Game:
         self.moon_marker = "moon_marker"
         self.moon_marker_position = 0
         self.card_board[0] = self.moon_marker
-        self.last_positions = []
-        self.turn_order = [p.name for p in reversed(self.players)]
+        self.last_positions = []  # (name, position) of the latest move of every player, the latest move last
+        self.turn_order = TurnOrder(p.name for p in reversed(self.players))
+        # Kept up to date by the moves and deals, so is_game_over does not rescan the players and the card board
+        self.cards_on_board = 0
+        self.players_at_goal = 0
         self.card_move_costs = {player.name: 0 for player in self.players} 
         self.gui = gui  # GUI reference
+        self.ai_pool = ai_pool  # AIWorkerPool shared by the AI turns of this session
         self.simulation_mode = simulation_mode
         self.in_simulation = False
         self.is_single_simulation = is_single_simulation
         self.turn_number = 1  # Initialize the turn number
         self.game_number = game_number  # Game number for tracking simulations
         self.game_over = False
+        self.zobrist_hash = None  # Only kept up to date while the AI searches the game
+        self.phase_timer = PhaseTimer() if time_phases else None  # Times the phases of the AI turns, see phase_timer
+        self.event_trace = event_trace  # EventTrace of the game's events, see event_trace
         self.deal()
-        self.statistics = {
-        'moves_per_player': {player.name: [] for player in self.players},
-        'turn_times': {player.name: [] for player in self.players},
-        'game_length': 0,
-        'winner': None,
-        'move_costs': {player.name: [] for player in self.players},
-        'scores_per_turn': {player.name: [] for player in self.players},
-        'per_turn_data': []
-    }
+        self.statistics = new_statistics(self.players)
 
 
     def set_gui(self, gui):
         # GUI set
         self.gui = gui
 
-    # Remove GUI from deepcopy:
+    # Remove GUI and the AI worker pool from deepcopy:
     def __getstate__(self):
         """Prepare the state for pickling by removing non-picklable attributes."""
         state = self.__dict__.copy()
         if 'gui' in state:
             del state['gui']
+        if 'ai_pool' in state:
+            del state['ai_pool']
+        if 'event_trace' in state:
+            del state['event_trace']
         return state
 
     def __setstate__(self, state):
         """Restore the state after unpickling."""
         self.__dict__.update(state)
         self.gui = None  # Re-initiate GUI as None
+        self.ai_pool = None
+        self.event_trace = None
+
+    def to_bytes(self):
+        # Compact binary snapshot of the state that affects play, see snapshot.py
+        from snapshot import game_to_bytes
+        return game_to_bytes(self)
+
+    @staticmethod
+    def from_bytes(data):
+        # A new game in the state of a to_bytes snapshot
+        from snapshot import game_from_bytes
+        return game_from_bytes(data)
 
     def next_round(self):
         # Handles a turn(round)
@@ -70,16 +187,7 @@ class Game:
         if self.is_game_over():
             self.end_game()
             return
-        least_movement = min(p.total_movement for p in self.players)
-        candidates = [p for p in self.players if p.total_movement == least_movement]
-        if len(candidates) == 1:
-            next_player = candidates[0]
-        else:
-            for player_name in reversed(self.turn_order):
-                if player_name in [p.name for p in candidates]:
-                    next_player = next(p for p in self.players if p.name == player_name)
-                    break
-        self.current_player_index = self.players.index(next_player)
+        self.current_player_index = self.players.index(self.get_next_player())
         if self.players[self.current_player_index].is_ai:
             self.ai_play_turn()
         if self.gui:
@@ -87,17 +195,23 @@ class Game:
             self.gui.update_inventory()
             self.gui.update_info()
 
-    def move_player(self, player, card):
-        # Move the player based on movement cost
+    def get_next_player(self):
+        # The player with the least total movement moves next, of equal ones the one whose last turn was the latest
+        last_turns = self.turn_order.last_turns
+        return min(self.players, key=lambda p: (p.total_movement, -last_turns.get(p.name, 0)))
+
+    def move_player(self, player, card, search=False):
+        # Move the player based on movement cost, search is set for the moves the AI searches and takes back
         if self.is_game_over():
-            self.end_game()
+            self.end_game(search)
             return
         movement = card.movement
         current_position = self.player_positions[player.name]
         new_position = (current_position + movement) % len(self.board)
 
         # Remove player from their current positon
-        self.board[current_position].remove(player)
+        old_index = self.board[current_position].index(player)
+        del self.board[current_position][old_index]
 
         # Add player to the new position
         self.board[new_position].append(player)
@@ -105,33 +219,47 @@ class Game:
         # Update player position
         self.player_positions[player.name] = new_position
         player.add_movement(movement)
+        for index, (name, _) in enumerate(self.last_positions):
+            if name == player.name:
+                del self.last_positions[index]
+                break
         self.last_positions.append((player.name, new_position))
         if self.gui:
             self.gui.player_has_moved(player)
-        self.check_end_game()
+        self.check_end_game(search)
+        return current_position, old_index
 
-    def check_end_game(self):
+    def check_end_game(self, search=False):
         # Checks if the game is over according to the rules
         if self.is_game_over():
             self.game_over = True
-            self.end_game()
+            self.end_game(search)
 
     def is_game_over(self):
         # Checks if the game is over
-        if any(player.score >= self.goal for player in self.players):
-            if self.in_simulation:
-                return False
-            else:
-                return True
-        if all(card is None or card == self.moon_marker for card in self.card_board) and len(self.deck) == 0:
-            return True
-        return False
-
-    def end_game(self):
+        if self.players_at_goal:
+            return not self.in_simulation
+        return self.cards_on_board == 0 and not self.deck
+
+    def count_end_game_state(self):
+        # Recounts cards_on_board and players_at_goal, for games whose board, scores or goal were set from outside
+        self.cards_on_board = sum(1 for card in self.card_board if card is not None and card != self.moon_marker)
+        self.players_at_goal = sum(1 for player in self.players if player.score >= self.goal)
+
+    def end_game(self, search=False):
+        # With search the game ended in a position the AI searched, it only settles the winner, without logging or the GUI
+        winner = self.settle_winner()
+        if search:
+            return
         logger.info("Game Over.")
         for player in self.players:
             logger.info(f"{player.name} final score: {player.score}")
-        # Perform necessary end-of-game processing
+        logger.info(f"Winner: {winner.name} with score: {winner.score}")
+        if self.gui:
+            self.show_end_game_window(self.statistics['final_scores'])
+
+    def settle_winner(self):
+        # Picks the winner and stores the final scores in the statistics, returns the winner
         highest_score = max(player.score for player in self.players)
         tied_players = [player for player in self.players if player.score == highest_score]
         
@@ -142,30 +270,44 @@ class Game:
         # Select the winner based on priority
         winner = min(tied_players, key=lambda p: player_priority.get(p.name, float('inf')))
         
-        logger.info(f"Winner: {winner.name} with score: {winner.score}")
-        
         # Store the winner in statistics
         self.statistics['winner'] = winner.name
         self.statistics['final_scores'] = {player.name: player.score for player in self.players}
-        
-        if self.gui:
-            self.show_end_game_window(self.statistics['final_scores'])
+        return winner
 
-    def deal(self):
-        # Filling the card board with cards from the deck
-        random.shuffle(self.deck)
+    def deal(self, search=False):
+        # Filling the card board with cards from the deck, search tells the event trace the AI will take it back
+        self.rng.shuffle(self.deck)
+        cards_in_deck = len(self.deck)
         for i in range(len(self.card_board)):
             if self.card_board[i] is None and self.deck:
                 self.card_board[i] = self.deck.pop()
-        self.check_end_game()
+        self.cards_on_board += cards_in_deck - len(self.deck)
+        trace = self.event_trace
+        if trace is not None:
+            trace.record(DEAL, a=cards_in_deck - len(self.deck), b=len(self.deck), search=search)
+        self.check_end_game(search)
 
     def get_remaining_cards(self):
         # Returns the amount of cards left in the deck
         return len(self.deck)
 
     def get_number_of_cards_on_board(self):
-        # Counts of number of active cards on the board
-        return sum(1 for card in self.card_board if card is not None and card != self.moon_marker)
+        # Number of active cards on the board
+        return self.cards_on_board
+
+    def set_card_board_slot(self, position, card):
+        # Changes to the card board made outside of the moves and deals, keeps cards_on_board counted
+        old_card = self.card_board[position]
+        self.cards_on_board -= old_card is not None and old_card != self.moon_marker
+        self.cards_on_board += card is not None and card != self.moon_marker
+        self.card_board[position] = card
+
+    def move_moon_marker(self, card_position):
+        # The moon marker takes the place of the card taken from card_position
+        self.card_board[self.moon_marker_position] = None
+        self.moon_marker_position = card_position
+        self.card_board[card_position] = self.moon_marker
 
     def get_available_card_positions(self):
         # Returns the drawable cards on the board
@@ -212,6 +354,10 @@ class Game:
         current_player.total_movement_at_turn_start = current_player.total_movement  # Update movement at turn start
         current_player.score_at_turn_start = current_player.score
         current_player.token_progress_since_turn_start = 0  # Initialize token progress
+        trace = self.event_trace
+        if trace is not None:
+            trace.turn_number = self.turn_number
+            trace.record(TURN_START, self.current_player_index, current_player.score, current_player.total_movement)
 
         if self.gui:
             # Existing GUI handling code
@@ -221,13 +367,15 @@ class Game:
             # Simulation mode
 
             # Safety Measure: Deal new cards if needed
-            cards_on_board = sum(1 for card in self.card_board if card is not None and card != self.moon_marker)
-            if cards_on_board <= 2 and self.deck:
+            if self.cards_on_board <= 2 and self.deck:
                 self.deal()
 
             start_time = time.time()
             possible_moves = get_possible_moves(self, current_player)
-            move = get_ai_move(self, current_player, depth=3, possible_moves=possible_moves)
+            move, search_statistics = get_ai_move(
+                self, current_player, depth=current_player.search_depth, possible_moves=possible_moves,
+                time_budget=current_player.time_budget, max_nodes=current_player.max_nodes, return_statistics=True
+            )
             end_time = time.time()
             turn_time = end_time - start_time
 
@@ -251,6 +399,9 @@ class Game:
                 'ai_personality': current_player.ai_personality,
                 'turn_time': turn_time
             }
+            turn_data.update(search_statistics.to_row())
+            if self.phase_timer is not None:
+                turn_data.update(self.phase_timer.end_turn())
             self.statistics['per_turn_data'].append(turn_data)
 
             if move:
@@ -260,6 +411,11 @@ class Game:
                 self.apply_move(current_player, move)
             else:
                 logger.debug(f"{current_player.name} has no valid moves.")
+            if trace is not None:
+                trace.record(
+                    TURN_END, self.players.index(current_player), current_player.score,
+                    current_player.total_movement, card.card_id if move else -1
+                )
 
             # Append current player's name to turn_order for tie-breaking
             self.turn_order.append(current_player.name)
@@ -275,26 +431,115 @@ class Game:
         # Add the card's movement cost to the player's total move costs in statistics
         self.statistics['move_costs'][player.name].append(card.movement)
 
-        player.inventory.add_card(card, x, y, player.name)
+        logger.info(f"{player.name} is adding card at ({x}, {y})")
+        player.inventory.add_card(card, x, y)
+        trace = self.event_trace
+        if trace is not None:
+            trace.record(MOVE_APPLIED, self.players.index(player), card.card_id, x, y)
         self.card_board[card_position] = None
+        self.cards_on_board -= 1
         self.move_player(player, card)
 
-        # Remove Moon Marker from its current positon
-        for i in range(len(self.card_board)):
-            if self.card_board[i] == self.moon_marker:
-                self.card_board[i] = None
-                break
-
-        # Place Moon Marker in its new position
-        self.moon_marker_position = card_position
-        self.card_board[card_position] = self.moon_marker
+        self.move_moon_marker(card_position)
 
         if self.get_number_of_cards_on_board() < 3:
             self.deal()
-        self.check_inventory(player)
+        completed_tokens = self.check_placement(player, x, y)
+        if trace is not None:
+            self.trace_completed_tokens(trace, player, completed_tokens)
         self.check_end_game()
 
+    def do_move(self, player, move):
+        # Apply a move in place (same rules as apply_move, without statistics) and return an undo record
+        # The AI search uses this with undo_move instead of copying the whole game for every node
+        card_position, (x, y) = move
+        card = self.card_board[card_position]
+        undo_record = {
+            'player': player,
+            'position': (x, y),
+            'card': card,
+            'card_board': self.card_board[:],
+            'cards_on_board': self.cards_on_board,
+            'moon_marker_position': self.moon_marker_position,
+            'last_positions': self.last_positions[:],
+            'players_at_goal': self.players_at_goal,
+            'deck': None,
+            'rng_state': None,
+            'moved_from': None,
+            'completed_tokens': [],
+            'game_over': self.game_over,
+            'winner': self.statistics.get('winner'),
+            'final_scores': self.statistics.get('final_scores'),
+            'zobrist_hash': self.zobrist_hash,
+        }
+
+        player.inventory.add_card(card, x, y)
+        trace = self.event_trace
+        if trace is not None:
+            trace.record(MOVE_APPLIED, self.players.index(player), card.card_id, x, y, search=True)
+        self.card_board[card_position] = None
+        self.cards_on_board -= 1
+        undo_record['moved_from'] = self.move_player(player, card, search=True)
+
+        self.move_moon_marker(card_position)
 
+        if self.get_number_of_cards_on_board() < 3:
+            undo_record['deck'] = self.deck[:]  # deal() shuffles the deck in place
+            undo_record['rng_state'] = self.rng.getstate()  # Undone deals give the same shuffle when dealt again
+            self.deal(search=True)
+        timer = self.phase_timer
+        if timer is None:
+            undo_record['completed_tokens'] = self.check_placement(player, x, y)
+        else:
+            started = time.perf_counter()
+            undo_record['completed_tokens'] = self.check_placement(player, x, y)
+            timer.add('token_checks', started)
+        if trace is not None:
+            self.trace_completed_tokens(trace, player, undo_record['completed_tokens'], search=True)
+        self.check_end_game(search=True)
+        if self.zobrist_hash is not None:
+            self.zobrist_hash ^= zobrist_move_delta(self, undo_record)
+        return undo_record
+
+    def trace_completed_tokens(self, trace, player, completed_tokens, search=False):
+        player_index = self.players.index(player)
+        for card, token_index, _, _ in completed_tokens:
+            trace.record(TOKEN_COMPLETED, player_index, card.card_id, token_index, player.score, search=search)
+
+    def undo_move(self, undo_record):
+        # Take back a move made with do_move, moves have to be undone in reverse order
+        player = undo_record['player']
+        x, y = undo_record['position']
+
+        for card, token_index, _, _ in undo_record['completed_tokens']:
+            self.completed_token_mask &= ~self.get_token_bit(card, token_index)
+        player.score -= len(undo_record['completed_tokens'])
+
+        if undo_record['deck'] is not None:
+            self.deck = undo_record['deck']
+            self.rng.setstate(undo_record['rng_state'])
+        self.card_board = undo_record['card_board']
+        self.cards_on_board = undo_record['cards_on_board']
+        self.players_at_goal = undo_record['players_at_goal']
+        self.moon_marker_position = undo_record['moon_marker_position']
+
+        if undo_record['moved_from'] is not None:
+            old_position, old_index = undo_record['moved_from']
+            self.board[self.player_positions[player.name]].pop()
+            self.board[old_position].insert(old_index, player)
+            self.player_positions[player.name] = old_position
+            player.total_movement -= undo_record['card'].movement
+            self.last_positions = undo_record['last_positions']
+
+        player.inventory.remove_card(x, y)
+
+        self.game_over = undo_record['game_over']
+        self.statistics['winner'] = undo_record['winner']
+        if undo_record['final_scores'] is None:
+            self.statistics.pop('final_scores', None)
+        else:
+            self.statistics['final_scores'] = undo_record['final_scores']
+        self.zobrist_hash = undo_record['zobrist_hash']
 
     def evaluate_placement(self, player, card, x, y):
         # Score the placement of cards (legacy AI)
@@ -305,30 +550,13 @@ class Game:
             return 0  # Return 0 score for invalid cards
     
         score = 0
-        adjacent_positions = [(x-1, y), (x+1, y), (x, y-1), (x, y+1)]
-        counts = {'red': 0, 'green': 0, 'blue': 0, 'yellow': 0}
-
-        def count_color_chain(nx, ny, color, visited):
-            if (nx, ny) in visited:
-                return 0
-            visited.add((nx, ny))
-            count = 1
-            for dx, dy in adjacent_positions:
-                adj_x, adj_y = nx + dx, ny + dy
-                neighbor_card = player.inventory.get_card(adj_x, adj_y)
-                if neighbor_card and neighbor_card.color == color:
-                    count += count_color_chain(adj_x, adj_y, color, visited)
-            return count
-
-        for ax, ay in adjacent_positions:
-            adjacent_card = player.inventory.get_card(ax, ay)
-            if adjacent_card:
-                visited = set()
-                chain_count = count_color_chain(ax, ay, adjacent_card.color, visited)
-                counts[adjacent_card.color] += chain_count
-
-        for token in card.tokens:
-            if not token.is_completed:
+        counts = {
+            color: player.inventory.get_adjacent_region_size(x, y, color)
+            for color in ['red', 'green', 'blue', 'yellow']
+        }
+
+        for token_index, token in enumerate(card.tokens):
+            if not self.is_token_completed(card, token_index):
                 if token.red:
                     score += counts['red']
                 if token.green:
@@ -342,69 +570,113 @@ class Game:
 
     def is_valid_placement(self, player, x, y):
         # Checks for valid inventory placement
-        if player.inventory.get_card(x, y) is not None:
-            return False  # Only an empty position can be valid
-        adjacent_positions = [(x-1, y), (x+1, y), (x, y-1), (x, y+1)]
-        for ax, ay in adjacent_positions:
-            if player.inventory.get_card(ax, ay) is not None:
-                return True
-        if len(player.inventory.get_all_cards()) == 0 and (x, y) == (player.inventory.center_x, player.inventory.center_y):
-            return True
-        return False
+        return player.inventory.is_valid_placement(x, y)
 
-    def check_inventory(self, player):
-        # Check the entire inventory of a player for token completion
-        for card, x, y in player.inventory.get_all_cards():
-            for token in card.tokens:
-                if not token.is_completed:
-                    self.check_token_completion(player, card, token, x, y)
-
-    def check_token_completion(self, player, card, token, x, y):
-        logger.debug(f"Checking token completion for {player.name}: {token.__dict__}")
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-
-        counts = {color: 0 for color in ['red', 'green', 'blue', 'yellow']}
-
-        for dx, dy in directions:
-            adj_x, adj_y = x + dx, y + dy
-            neighbor_card = player.inventory.get_card(adj_x, adj_y)
-            if neighbor_card and neighbor_card.color in counts:
-                chain_count, _ = self.count_color_chain(
-                    player, adj_x, adj_y, neighbor_card.color, exclude_position=(x, y)
-                )
-                counts[neighbor_card.color] += chain_count
+    def get_token_bit(self, card, token_index):
+        return 1 << (card.card_id * MAX_TOKENS + token_index)
 
-        for color, required_count in token.__dict__.items():
-            if required_count and counts.get(color, 0) < required_count:
-                logger.debug(
-                    f"Token not completed for {player.name}: needed {required_count} {color}, found {counts[color]}"
-                )
-                return
+    def is_token_completed(self, card, token_index):
+        return bool(self.completed_token_mask & self.get_token_bit(card, token_index))
 
-        token.is_completed = True
+    def check_inventory(self, player):
+        # Check the entire inventory of a player for token completion, returns the newly completed tokens with their card, token index and position
+        completed_tokens = []
+        for card, x, y in player.inventory.get_all_cards():
+            satisfied_tokens = None
+            for token_index in range(len(card.tokens)):
+                if not self.is_token_completed(card, token_index):
+                    if satisfied_tokens is None:
+                        satisfied_tokens = self.get_satisfied_tokens(player, x, y, card.token_colors)
+                    if self.check_token_completion(player, card, token_index, x, y, satisfied_tokens):
+                        completed_tokens.append((card, token_index, x, y))
+        return completed_tokens
+
+    def check_placement(self, player, x, y):
+        # Same as check_inventory right after a card was placed at (x, y), but only re-checks the tokens that placement can complete
+        # Every other card saw no change in its color counts, so its open tokens are still not completed
+        color = player.inventory.get_card(x, y).color
+        completed_tokens = []
+        for card_x, card_y in player.inventory.get_affected_positions(x, y):
+            card = player.inventory.get_card(card_x, card_y)
+            satisfied_tokens = None
+            for token_index, token in enumerate(card.tokens):
+                if (card_x, card_y) != (x, y) and not getattr(token, color):
+                    continue  # Only the count of the placed card's color changed around this card
+                if not self.is_token_completed(card, token_index):
+                    if satisfied_tokens is None:
+                        satisfied_tokens = self.get_satisfied_tokens(player, card_x, card_y, card.token_colors)
+                    if self.check_token_completion(player, card, token_index, card_x, card_y, satisfied_tokens):
+                        completed_tokens.append((card, token_index, card_x, card_y))
+        return completed_tokens
+
+    def count_placement_tokens(self, player, card, x, y):
+        # Number of tokens placing the card at (x, y) would complete, len(check_placement) after the placement,
+        # worked out from the region sizes next to (x, y) without placing the card
+        # Leaving (x, y) out of its neighbours' regions is how the placed card counts them once it is there
+        satisfied_tokens = self.get_satisfied_tokens(player, x, y, card.token_colors)
+        return self.count_card_tokens(card, satisfied_tokens) + self.count_region_tokens(player, card.color, x, y)
+
+    def count_card_tokens(self, card, satisfied_tokens):
+        # Open tokens of the card itself that the color counts of a cell satisfy, see get_satisfied_tokens
+        return sum(
+            1 for token_index, token in enumerate(card.tokens)
+            if satisfied_tokens & token.token_bit and not self.is_token_completed(card, token_index)
+        )
+
+    def count_region_tokens(self, player, color, x, y):
+        # Tokens of the other cards a card of the given color would complete at (x, y), they only depend on its color
+        # The other cards check_placement looks at: the region the card joins and the cards bordering it,
+        # only their open tokens asking for the card's color can complete
+        inventory = player.inventory
+        region = collect_placed_region(inventory, (x, y), color, (x, y))
+        border = {
+            (cx + dx, cy + dy) for cx, cy in region for dx, dy in DIRECTIONS
+            if (cx + dx, cy + dy) not in region and inventory.get_card(cx + dx, cy + dy) is not None
+        }
+        completed_tokens = 0
+        for card_x, card_y in (region - {(x, y)}) | border:
+            affected_card = inventory.get_card(card_x, card_y)
+            open_tokens = [
+                token for token_index, token in enumerate(affected_card.tokens)
+                if getattr(token, color) and not self.is_token_completed(affected_card, token_index)
+            ]
+            if not open_tokens:
+                continue
+            counts = []
+            for count_color in COLORS:
+                if count_color not in affected_card.token_colors:
+                    counts.append(0)
+                elif count_color != color:
+                    counts.append(inventory.get_adjacent_region_size(card_x, card_y, count_color))
+                else:
+                    counts.append(count_placed_color(inventory, card_x, card_y, affected_card, (x, y), color, region))
+            satisfied_tokens = SATISFIED_TOKENS[get_count_state(*counts)]
+            completed_tokens += sum(1 for token in open_tokens if satisfied_tokens & token.token_bit)
+        return completed_tokens
+
+    def get_satisfied_tokens(self, player, x, y, colors=COLORS):
+        # Bitset of the tokens the color counts around (x, y) satisfy, see Token.SATISFIED_TOKENS
+        # Colors left out count as 0, the result is only right for tokens that do not ask for them
+        inventory = player.inventory
+        return SATISFIED_TOKENS[get_count_state(*[
+            inventory.get_adjacent_region_size(x, y, color) if color in colors else 0 for color in COLORS
+        ])]
+
+    def check_token_completion(self, player, card, token_index, x, y, satisfied_tokens=None):
+        # The checks of one card can share its satisfied_tokens lookup
+        # Completed tokens are events of the game's EventTrace, this runs for every move the AI searches
+        token = card.tokens[token_index]
+        if satisfied_tokens is None:
+            satisfied_tokens = self.get_satisfied_tokens(player, x, y, card.token_colors)
+        if not satisfied_tokens & token.token_bit:
+            return False
+
+        self.completed_token_mask |= self.get_token_bit(card, token_index)
         player.score += 1
-        logger.info(f"{player.name} completed a token! New score: {player.score}")
-
-            
-    def count_color_chain(self, player, x, y, color, exclude_position=None):
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-        visited = set()
-        count = self._count_color_chain_recursive(player, x, y, color, visited, directions, exclude_position)
-        return count, visited
-
-
-    def _count_color_chain_recursive(self, player, nx, ny, color, visited, directions, exclude_position):
-        if (nx, ny) in visited or (exclude_position and (nx, ny) == exclude_position):
-            return 0
-        visited.add((nx, ny))
-        count = 1
-        for dx, dy in directions:
-            adj_x, adj_y = nx + dx, ny + dy
-            neighbor_card = player.inventory.get_card(adj_x, adj_y)
-            if neighbor_card and neighbor_card.color == color:
-                count += self._count_color_chain_recursive(player, adj_x, adj_y, color, visited, directions, exclude_position)
-        return count
-    
+        if player.score == self.goal:
+            self.players_at_goal += 1
+        return True
+
     def simulate_game(self):
         """Run a game simulation without GUI."""
         self.turn_number = 1
@@ -1,12 +1,12 @@
 import tkinter as tk
 from game import Game
-from ai import get_ai_move
+from ai import get_ai_move, AIWorkerPool
+from event_trace import EventTrace
+from simulation import run_simulations
 import threading
 import queue
 import logging
 import csv
-from multiprocessing import Pool, cpu_count
-import gc
 
 # Configure logging
 logging.basicConfig(
@@ -16,8 +16,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class NovaLunaGUI:
-    def __init__(self):
+    def __init__(self, trace_path=None):
         self.root = None  # The main game window will be created later
+        self.trace_path = trace_path  # File the game's events are traced to, None to not trace
+        self.event_trace = None
         self.initialize_window = tk.Tk()
         self.initialize_window.title("Game Setup")
         self.ai_vars = []
@@ -25,11 +27,12 @@ class NovaLunaGUI:
         self.goal_var = tk.IntVar(value=10)
         self.fastmode_var = tk.BooleanVar(value=True)  # Variable to store Fastmode status
         self.user_controls_enabled = True
+        self.ai_pool = AIWorkerPool()  # Worker processes are only started by the first AI move
         self.create_initialize_window()
 
     def create_initialize_window(self):
         # Create the initialization window
-        self.initialize_window.geometry("400x500")  # Adjust the size to accommodate new widgets
+        self.initialize_window.geometry("560x500")  # Adjust the size to accommodate new widgets
 
         tk.Label(self.initialize_window, text="Number of Players:").pack(pady=5)
         num_players_spinbox = tk.Spinbox(
@@ -57,10 +60,17 @@ class NovaLunaGUI:
         ai_frame.pack(pady=10)
 
         tk.Label(ai_frame, text="AI Personality:").grid(row=0, column=0, padx=10)
+        tk.Label(ai_frame, text="Depth").grid(row=0, column=2, padx=5)
+        tk.Label(ai_frame, text="Time (s)").grid(row=0, column=3, padx=5)
+        tk.Label(ai_frame, text="Nodes").grid(row=0, column=4, padx=5)
 
         # Define the AI personality options
         ai_personality_options = ["Human", "Balanced", "Power", "Combo", "Greedy", "Random"]
         self.ai_personality_vars = []
+        # Search settings per player, an empty time or node budget means a fixed depth search
+        self.search_depth_vars = []
+        self.time_budget_vars = []
+        self.max_nodes_vars = []
 
         for i in range(4):
             var = tk.StringVar(value="Human")
@@ -78,6 +88,16 @@ class NovaLunaGUI:
             if i >= self.num_players_var.get():
                 option_menu.config(state=tk.DISABLED)
 
+            search_depth_var = tk.IntVar(value=3)
+            time_budget_var = tk.StringVar(value="")
+            max_nodes_var = tk.StringVar(value="")
+            self.search_depth_vars.append(search_depth_var)
+            self.time_budget_vars.append(time_budget_var)
+            self.max_nodes_vars.append(max_nodes_var)
+            tk.Spinbox(ai_frame, from_=1, to=6, width=3, textvariable=search_depth_var, state="readonly").grid(row=i + 1, column=2, padx=5)
+            tk.Entry(ai_frame, width=6, textvariable=time_budget_var).grid(row=i + 1, column=3, padx=5)
+            tk.Entry(ai_frame, width=8, textvariable=max_nodes_var).grid(row=i + 1, column=4, padx=5)
+
         def update_ai_personality_state(*args):
             for i in range(4):
                 option_menu = ai_frame.grid_slaves(row=i + 1, column=1)[0]
@@ -125,13 +145,17 @@ class NovaLunaGUI:
         simulation_mode = self.simulation_var.get()
         num_simulations = self.num_simulations_var.get()
 
-        self.game = Game(num_players, goal)
+        if self.trace_path is not None:
+            self.event_trace = EventTrace(path=self.trace_path)
+        self.game = Game(num_players, goal, ai_pool=self.ai_pool, event_trace=self.event_trace)
 
+        search_settings = self.get_search_settings()
         for i in range(num_players):
             ai_personality = self.ai_personality_vars[i].get()
             if ai_personality != "Human":
                 self.game.players[i].is_ai = True
                 self.game.players[i].ai_personality = ai_personality
+                self.game.players[i].set_search_settings(**search_settings[i])
             else:
                 self.game.players[i].is_ai = False
                 self.game.players[i].ai_personality = None
@@ -144,10 +168,29 @@ class NovaLunaGUI:
         else:
             self.initialize_game()
 
+    def get_search_settings(self):
+        # Search depth and budgets entered for each player, blank or invalid budgets mean no budget
+        def parse_budget(value, cast):
+            try:
+                budget = cast(value)
+            except ValueError:
+                return None
+            return budget if budget > 0 else None
+
+        return [
+            {
+                'search_depth': self.search_depth_vars[i].get(),
+                'time_budget': parse_budget(self.time_budget_vars[i].get(), float),
+                'max_nodes': parse_budget(self.max_nodes_vars[i].get(), int),
+            }
+            for i in range(4)
+        ]
+
     def initialize_game(self):
         # Create the main game window
         self.root = tk.Tk()
         self.root.title("Nova Luna")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         self.selected_card = None
         self.selected_card_position = None
@@ -369,10 +412,10 @@ class NovaLunaGUI:
 
         if card_position in self.available_positions:
             if self.selected_card is not None and self.selected_card_position is not None:
-                self.game.card_board[self.selected_card_position] = self.selected_card
+                self.game.set_card_board_slot(self.selected_card_position, self.selected_card)
             self.selected_card_position = card_position
             self.selected_card = self.game.card_board[card_position]
-            self.game.card_board[card_position] = None
+            self.game.set_card_board_slot(card_position, None)
             self.update_board()
 
             # Display the picked card
@@ -547,13 +590,9 @@ class NovaLunaGUI:
         x, y = grid_position
         if self.is_valid_placement(player, x, y):
             try:
-                player.inventory.add_card(self.selected_card, x, y, player.name)
-                self.game.moon_marker_position = self.selected_card_position
-                for i in range(len(self.game.card_board)):
-                    if self.game.card_board[i] == self.game.moon_marker:
-                        self.game.card_board[i] = None
-                        break
-                self.game.card_board[self.selected_card_position] = self.game.moon_marker
+                logger.info(f"{player.name} is adding card at ({x}, {y})")
+                player.inventory.add_card(self.selected_card, x, y)
+                self.game.move_moon_marker(self.selected_card_position)
                 self.game.move_player(player, self.selected_card)
                 self.selected_card = None
                 self.selected_card_position = None
@@ -632,8 +671,7 @@ class NovaLunaGUI:
     def update_deal_button_state(self):
         if not self.user_controls_enabled:
             self.deal_button.config(state=tk.DISABLED)
-        cards_on_board = sum(1 for card in self.game.card_board if card is not None and card != self.game.moon_marker)
-        if cards_on_board >= 3 or len(self.game.deck) == 0:
+        if self.game.cards_on_board >= 3 or len(self.game.deck) == 0:
             self.deal_button.config(state=tk.DISABLED)
         else:
             self.deal_button.config(state=tk.NORMAL)
@@ -664,13 +702,9 @@ class NovaLunaGUI:
         if len(current_player.inventory.get_all_cards()) == 0:
             center_x = current_player.inventory.center_x
             center_y = current_player.inventory.center_y
-            current_player.inventory.add_card(self.selected_card, center_x, center_y, current_player.name)
-            self.game.moon_marker_position = self.selected_card_position
-            for i in range(len(self.game.card_board)):
-                if self.game.card_board[i] == self.game.moon_marker:
-                    self.game.card_board[i] = None
-                    break
-            self.game.card_board[self.selected_card_position] = self.game.moon_marker
+            logger.info(f"{current_player.name} is adding card at ({center_x}, {center_y})")
+            current_player.inventory.add_card(self.selected_card, center_x, center_y)
+            self.game.move_moon_marker(self.selected_card_position)
             self.game.move_player(current_player, self.selected_card)
             self.selected_card = None
             self.selected_card_position = None
@@ -690,7 +724,7 @@ class NovaLunaGUI:
         current_position = self.game.moon_marker_position
         positions = []
         count = 0
-        total_cards = sum(1 for card in self.game.card_board if card is not None and card != self.game.moon_marker)
+        total_cards = self.game.cards_on_board
         if total_cards < 3:
             for i in range(len(self.game.card_board)):
                 if self.game.card_board[i] is not None and self.game.card_board[i] != self.game.moon_marker:
@@ -705,21 +739,19 @@ class NovaLunaGUI:
 
     def refill_card_board_if_needed(self):
         # Refills the card board if needed/possible
-        cards_on_board = sum(1 for card in self.game.card_board if card is not None and card != self.game.moon_marker)
-        if cards_on_board == 0 and self.game.deck:
+        if self.game.cards_on_board == 0 and self.game.deck:
             for i in range(len(self.game.card_board)):
                 if self.game.card_board[i] is None and self.game.deck:
-                    self.game.card_board[i] = self.game.deck.pop()
+                    self.game.set_card_board_slot(i, self.game.deck.pop())
             self.update_board()
         self.game.check_end_game()
 
     def deal_cards(self):
         # Manually refill the card board when "Deal" is clicked
-        cards_on_board = sum(1 for card in self.game.card_board if card is not None and card != self.game.moon_marker)
-        if cards_on_board < 3 and self.game.deck:
+        if self.game.cards_on_board < 3 and self.game.deck:
             for i in range(len(self.game.card_board)):
                 if self.game.card_board[i] is None and self.game.deck:
-                    self.game.card_board[i] = self.game.deck.pop()
+                    self.game.set_card_board_slot(i, self.game.deck.pop())
             self.update_board()
         self.update_deal_button_state()  # Update the deal button state after dealing
 
@@ -733,6 +765,8 @@ class NovaLunaGUI:
             self.inventory_window.destroy()
         if self.root:
             self.root.destroy()
+        self.ai_pool.close()
+        self.close_event_trace()
 
         end_game_window = tk.Tk()
         end_game_window.title("Game Over")
@@ -749,10 +783,21 @@ class NovaLunaGUI:
 
         end_game_window.mainloop()
 
+    def on_close(self):
+        # Closing the main window stops the AI workers too, even if an AI is still thinking
+        self.ai_pool.close(wait=False)
+        self.close_event_trace()
+        self.root.destroy()
+
+    def close_event_trace(self):
+        if self.event_trace is not None:
+            self.event_trace.close()
+            self.event_trace = None
+
     def start_new_game(self, window):
         # Close the current window and start a new game
         window.destroy()
-        app = NovaLunaGUI()  # Create a new instance of the NovaLunaGUI class
+        app = NovaLunaGUI(self.trace_path)  # Create a new instance of the NovaLunaGUI class, the trace file starts over
         app.run()
 
     def run(self):
@@ -768,13 +813,15 @@ class NovaLunaGUI:
 
         # **Safety Measure**
         # Check if there are 2 or fewer cards on the card board
-        cards_on_board = sum(1 for card in self.game.card_board if card is not None and card != self.game.moon_marker)
-        if cards_on_board <= 2 and self.game.deck:
+        if self.game.cards_on_board <= 2 and self.game.deck:
             self.deal_cards()
 
         def ai_task():
             # Perform the AI computation in a separate thread
-            move = get_ai_move(self.game, current_player, depth=3)  # Adjust depth as needed, 3 for default
+            move = get_ai_move(
+                self.game, current_player, depth=current_player.search_depth,
+                time_budget=current_player.time_budget, max_nodes=current_player.max_nodes
+            )
             # Put the result into the queue
             self.ai_queue.put((current_player, move))
 
@@ -960,59 +1007,10 @@ class NovaLunaGUI:
             self.fastmode_check.config(state=tk.NORMAL)
 
     def run_simulations(self, num_simulations, goal):
-        max_concurrent_simulations = min(cpu_count(), 10)  # Cap at 10 or the number of CPU cores
         num_players = self.num_players_var.get()
         ai_personalities = [var.get() for var in self.ai_personality_vars]
-        is_single_simulation = num_simulations == 1
-
-        logger.info(f"Running simulation{'...' if is_single_simulation else f's with up to {max_concurrent_simulations} processes...'}")
-
-        per_player_data = []
-        per_turn_data = []
-
-        if is_single_simulation:
-            stats = run_single_simulation(1, num_players, goal, ai_personalities, is_single_simulation)
-            player_data, turn_data = stats
-            per_player_data.extend(player_data)
-            per_turn_data.extend(turn_data)
-        else:
-            with Pool(processes=max_concurrent_simulations) as pool:
-                # Prepare arguments for the worker function
-                simulation_args = [
-                    (i, num_players, goal, ai_personalities, is_single_simulation)
-                    for i in range(1, num_simulations + 1)
-                ]
-                # Run simulations in parallel
-                for i, (player_data, turn_data) in enumerate(pool.starmap(run_single_simulation, simulation_args), 1):
-                    print(f"Simulation {i}/{num_simulations} complete")
-                    per_player_data.extend(player_data)
-                    per_turn_data.extend(turn_data)
-
-        # Save results to CSV
-        self.save_per_player_data_to_csv(per_player_data)
-        self.save_per_turn_data_to_csv(per_turn_data)
-
-        print("Simulations complete. Data saved to simulations.csv and thinking_times.csv.")
-
-    def save_per_player_data_to_csv(self, data):
-        if not data:
-            return
-        keys = ['game_number', 'winner_name', 'winner_ai_type', 'game_length', 'player_name', 'player_ai_type', 'average_score_per_turn', 'average_move_cost']
-        with open('simulations.csv', 'w', newline='') as output_file:
-            dict_writer = csv.DictWriter(output_file, fieldnames=keys)
-            dict_writer.writeheader()
-            for row in data:
-                csv_row = {
-                    'game_number': row['game_number'],
-                    'winner_name': row['winner_name'],
-                    'winner_ai_type': row['winner_ai_type'],
-                    'game_length': row['game_length'],
-                    'player_name': row['player_name'],
-                    'player_ai_type': row['player_ai_type'],
-                    'average_score_per_turn': "{:.2f}".format(row['average_score_per_turn']),
-                    'average_move_cost': "{:.2f}".format(row['average_move_cost']),
-                }
-                dict_writer.writerow(csv_row)
+        search_settings = self.get_search_settings()
+        run_simulations(num_simulations, num_players, goal, ai_personalities, search_settings)
 
     def save_data_to_csv(self, data):
         if not data:
@@ -1032,73 +1030,8 @@ class NovaLunaGUI:
                 }
                 dict_writer.writerow(csv_row)
 
-    def save_per_turn_data_to_csv(self, data):
-        if not data:
-            return
-        keys = data[0].keys()
-        with open('thinking_times.csv', 'w', newline='') as output_file:
-            dict_writer = csv.DictWriter(output_file, fieldnames=keys)
-            dict_writer.writeheader()
-            for row in data:
-                # Format the turn time
-                turn_time = float(row['turn_time'])
-                if turn_time < 1:
-                    row['turn_time'] = "{:.2f}".format(turn_time)
-                else:
-                    row['turn_time'] = "{:.0f}".format(turn_time)
-                dict_writer.writerow(row)
-
-
     def run(self):
         if self.root:
             self.root.mainloop()
         else:
             self.initialize_window.mainloop()
-
-
-
-def run_single_simulation(simulation_id, num_players, goal, ai_personalities, is_single_simulation):
-    """
-    Run a single simulation and return its data.
-    """
-    try:
-        # Initialize game
-        game = Game(num_players=num_players, goal=goal, gui=None, simulation_mode=True, is_single_simulation=is_single_simulation, game_number=simulation_id)
-        for j, player in enumerate(game.players):
-            player.is_ai = True
-            player.ai_personality = ai_personalities[j]
-
-        # Run the simulation
-        game.simulate_game()
-
-        # Collect per-player data
-        winner_name = game.statistics.get('winner', 'No Winner')
-        winner_ai_type = game.statistics.get('winner_ai_type', 'Unknown')
-        game_length = game.statistics.get('game_length', 0)
-        simulation_player_data = []
-        for player in game.players:
-            num_turns = len(game.statistics['turn_times'][player.name])
-            avg_score_per_turn = player.score / num_turns if num_turns > 0 else 0
-            avg_move_cost = (
-                sum(game.statistics['move_costs'][player.name]) / num_turns if num_turns > 0 else 0
-            )
-            simulation_player_data.append({
-                'game_number': simulation_id,
-                'player_name': player.name,
-                'player_ai_type': player.ai_personality,
-                'winner_name': winner_name,
-                'winner_ai_type': winner_ai_type,
-                'game_length': game_length,
-                'average_score_per_turn': round(avg_score_per_turn, 2),
-                'average_move_cost': round(avg_move_cost, 2)
-            })
-
-        # Collect per-turn data
-        simulation_turn_data = game.statistics['per_turn_data']
-
-        return simulation_player_data, simulation_turn_data
-
-    finally:
-        # Cleanup game instance
-        del game
-        gc.collect()
\ No newline at end of file
@@ -1,6 +1,12 @@
+import argparse
+
 from gui import NovaLunaGUI
 
 #Run this file to run the game
+#   python main.py --trace game.trace   traces the game's events to game.trace, see event_trace
 if __name__ == "__main__":
-    app = NovaLunaGUI()
-    app.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Nova Luna")
+    parser.add_argument('--trace', default=None, help="Trace the events of the game to this file")
+    args = parser.parse_args()
+    app = NovaLunaGUI(trace_path=args.trace)
+    app.run()
@@ -0,0 +1,46 @@
+import time
+
+# Phases of an AI turn, in the order of their columns in thinking_times.csv
+# token_checks run inside apply_move, so their time is also part of the apply_move time
+PHASES = ('move_generation', 'copy', 'apply_move', 'token_checks', 'undo_move', 'evaluation', 'transposition')
+PHASE_FIELDS = [f'{phase}_{column}' for phase in PHASES for column in ('calls', 'time')]
+
+
+class PhaseTimer:
+    # Accumulates the time and the number of calls of every phase, for the current turn and for the whole game
+    # A game times its phases only when game.phase_timer is set, the timed code just checks it for None:
+    #   if timer is not None:
+    #       started = time.perf_counter()
+    #   ...
+    #   if timer is not None:
+    #       timer.add('evaluation', started)
+
+    def __init__(self):
+        self.turn_times = dict.fromkeys(PHASES, 0.0)
+        self.turn_calls = dict.fromkeys(PHASES, 0)
+        self.game_times = dict.fromkeys(PHASES, 0.0)
+        self.game_calls = dict.fromkeys(PHASES, 0)
+
+    def add(self, phase, started):
+        # started is the time.perf_counter() value taken when the phase began
+        self.turn_times[phase] += time.perf_counter() - started
+        self.turn_calls[phase] += 1
+
+    def merge(self, other):
+        # Add the turn counters of another timer, e.g. the one of a worker process that searched part of the turn
+        # Worker phases overlap in time, so a turn's phase times can add up to more than its turn_time
+        for phase in PHASES:
+            self.turn_times[phase] += other.turn_times[phase]
+            self.turn_calls[phase] += other.turn_calls[phase]
+
+    def end_turn(self):
+        # Returns the PHASE_FIELDS columns of the turn, adds it to the game totals and starts the next turn
+        row = {}
+        for phase in PHASES:
+            row[f'{phase}_calls'] = self.turn_calls[phase]
+            row[f'{phase}_time'] = self.turn_times[phase]
+            self.game_calls[phase] += self.turn_calls[phase]
+            self.game_times[phase] += self.turn_times[phase]
+        self.turn_times = dict.fromkeys(PHASES, 0.0)
+        self.turn_calls = dict.fromkeys(PHASES, 0)
+        return row
@@ -0,0 +1,308 @@
+import argparse
+import csv
+import gc
+import logging
+import os
+import random
+from multiprocessing import Pool, cpu_count
+
+from ai import SEARCH_FIELDS, AIWorkerPool
+from event_trace import EventTrace
+from game import Game, create_game_rng
+from phase_timer import PHASE_FIELDS
+
+# Headless batch simulations, never imports tkinter so it runs on machines without a display, e.g.:
+#   python -m simulation --players 4 --personalities Balanced Power Combo Greedy --games 1000 --outdir results
+# A campaign can be split across machines and merged again:
+#   python -m simulation --games 100000 --seed 7 --shard 1/2 --outdir shard1   (and --shard 2/2 --outdir shard2)
+#   python -m simulation --merge shard1 shard2 --outdir campaign
+# --trace-dir writes the event trace of every game to its own file, read it back with event_trace.read_trace_file:
+#   python -m simulation --games 10 --trace-dir traces   (traces/game1.trace ... traces/game10.trace)
+
+logger = logging.getLogger(__name__)
+
+AI_PERSONALITIES = ["Balanced", "Power", "Combo", "Greedy", "Random"]
+PER_PLAYER_FIELDS = [
+    'game_number', 'winner_name', 'winner_ai_type', 'game_length', 'player_name', 'player_ai_type',
+    'average_score_per_turn', 'average_move_cost'
+]
+PER_TURN_FIELDS = ['game_number', 'turn_number', 'player_name', 'ai_personality', 'turn_time'] + SEARCH_FIELDS
+
+
+def run_single_simulation(simulation_id, num_players, goal, ai_personalities, is_single_simulation, search_settings=None, seed=None, time_phases=False, trace_dir=None):
+    """
+    Run a single simulation and return its data.
+    search_settings optionally holds a dict of Player.set_search_settings arguments per player.
+    The game's random generator is derived from the campaign seed and the simulation id.
+    With time_phases every turn row also holds the PHASE_FIELDS columns.
+    With trace_dir the game's events are traced to game<simulation_id>.trace in that directory.
+    """
+    event_trace = None
+    try:
+        # Initialize game
+        # A single simulation searches with worker processes, kept for the whole game
+        ai_pool = AIWorkerPool() if is_single_simulation else None
+        rng = create_game_rng(seed, simulation_id) if seed is not None else None
+        if trace_dir is not None:
+            event_trace = EventTrace(path=os.path.join(trace_dir, f'game{simulation_id}.trace'))
+        game = Game(num_players=num_players, goal=goal, gui=None, simulation_mode=True, is_single_simulation=is_single_simulation, game_number=simulation_id, ai_pool=ai_pool, rng=rng, time_phases=time_phases, event_trace=event_trace)
+        for j, player in enumerate(game.players):
+            player.is_ai = True
+            player.ai_personality = ai_personalities[j]
+            if search_settings:
+                player.set_search_settings(**search_settings[j])
+
+        # Run the simulation
+        game.simulate_game()
+
+        # Collect per-player data
+        winner_name = game.statistics.get('winner', 'No Winner')
+        winner_ai_type = game.statistics.get('winner_ai_type', 'Unknown')
+        game_length = game.statistics.get('game_length', 0)
+        simulation_player_data = []
+        for player in game.players:
+            num_turns = len(game.statistics['turn_times'][player.name])
+            avg_score_per_turn = player.score / num_turns if num_turns > 0 else 0
+            avg_move_cost = (
+                sum(game.statistics['move_costs'][player.name]) / num_turns if num_turns > 0 else 0
+            )
+            simulation_player_data.append({
+                'game_number': simulation_id,
+                'player_name': player.name,
+                'player_ai_type': player.ai_personality,
+                'winner_name': winner_name,
+                'winner_ai_type': winner_ai_type,
+                'game_length': game_length,
+                'average_score_per_turn': round(avg_score_per_turn, 2),
+                'average_move_cost': round(avg_move_cost, 2)
+            })
+
+        # Collect per-turn data
+        simulation_turn_data = game.statistics['per_turn_data']
+
+        return simulation_player_data, simulation_turn_data
+
+    finally:
+        # Cleanup game instance
+        if ai_pool is not None:
+            ai_pool.close()
+        if event_trace is not None:
+            event_trace.close()
+        del game
+        gc.collect()
+
+
+def run_simulation_task(simulation_args):
+    # Pool.imap_unordered passes one argument, unpack it for run_single_simulation
+    return run_single_simulation(*simulation_args)
+
+
+def run_simulations(num_simulations, num_players, goal, ai_personalities, search_settings=None, max_workers=None, seed=None, output_dir='.', fsync_every=100, shard=(1, 1), time_phases=False, trace_dir=None):
+    # Play the games, in worker processes when there is more than one, and save the results to CSV in output_dir
+    # Every game's rows are written as soon as it finishes, so a run that dies keeps the games already played
+    # shard (i, N) plays game numbers i, i+N, i+2N, ..., the N shards of one seed together play the whole campaign
+    # time_phases adds the time and call count of every AI phase of a turn to thinking_times.csv
+    # trace_dir gets the event trace file of every game
+    max_concurrent_simulations = max_workers or min(cpu_count(), 10)  # Cap at 10 or the number of CPU cores
+    is_single_simulation = num_simulations == 1
+    if seed is None:
+        # Worker processes start with the same global random state, a campaign seed keeps their games apart
+        seed = random.randrange(2 ** 32)
+        print(f"Campaign seed {seed}, pass --seed {seed} to play these games again")
+    shard_index, shard_count = shard
+    game_numbers = range(shard_index, num_simulations + 1, shard_count)
+    if trace_dir is not None:
+        os.makedirs(trace_dir, exist_ok=True)
+
+    logger.info(f"Running simulation{'...' if is_single_simulation else f's with up to {max_concurrent_simulations} processes...'}")
+
+    with SimulationResultWriter(output_dir, fsync_every, time_phases) as result_writer:
+        if is_single_simulation:
+            for i in game_numbers:
+                player_data, turn_data = run_single_simulation(i, num_players, goal, ai_personalities, is_single_simulation, search_settings, seed, time_phases, trace_dir)
+                result_writer.write_game(player_data, turn_data)
+        else:
+            with Pool(processes=max_concurrent_simulations) as pool:
+                # The pool's task handler queues all of these up front, each is only a game number and the shared settings
+                simulation_args = (
+                    (i, num_players, goal, ai_personalities, is_single_simulation, search_settings, seed, time_phases, trace_dir)
+                    for i in game_numbers
+                )
+                # Games arrive in the order they finish
+                for i, (player_data, turn_data) in enumerate(pool.imap_unordered(run_simulation_task, simulation_args), 1):
+                    result_writer.write_game(player_data, turn_data)
+                    print(f"Simulation {i}/{len(game_numbers)} complete")
+
+    print(f"Simulations complete. Data saved to simulations.csv and thinking_times.csv in {output_dir}.")
+
+
+class SimulationResultWriter:
+    # Appends the rows of every finished game to simulations.csv and thinking_times.csv
+    # The rows are flushed after every game and synced to disk every fsync_every games and on close
+    # With time_phases thinking_times.csv also has the PHASE_FIELDS columns
+
+    def __init__(self, output_dir='.', fsync_every=100, time_phases=False):
+        os.makedirs(output_dir, exist_ok=True)
+        self.fsync_every = fsync_every
+        self.games_written = 0
+        self.per_player_file = open(os.path.join(output_dir, 'simulations.csv'), 'w', newline='')
+        self.per_turn_file = open(os.path.join(output_dir, 'thinking_times.csv'), 'w', newline='')
+        self.per_player_writer = csv.DictWriter(self.per_player_file, fieldnames=PER_PLAYER_FIELDS)
+        per_turn_fields = PER_TURN_FIELDS + PHASE_FIELDS if time_phases else PER_TURN_FIELDS
+        self.per_turn_writer = csv.DictWriter(self.per_turn_file, fieldnames=per_turn_fields)
+        self.per_player_writer.writeheader()
+        self.per_turn_writer.writeheader()
+
+    def write_game(self, player_data, turn_data):
+        for row in player_data:
+            self.per_player_writer.writerow(format_per_player_row(row))
+        for row in turn_data:
+            self.per_turn_writer.writerow(format_per_turn_row(row))
+        self.per_player_file.flush()
+        self.per_turn_file.flush()
+        self.games_written += 1
+        if self.fsync_every and self.games_written % self.fsync_every == 0:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self.per_player_file.fileno())
+        os.fsync(self.per_turn_file.fileno())
+
+    def close(self):
+        if self.per_player_file.closed:
+            return
+        self.per_player_file.flush()
+        self.per_turn_file.flush()
+        self.sync()
+        self.per_player_file.close()
+        self.per_turn_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def format_per_player_row(row):
+    return {
+        'game_number': row['game_number'],
+        'winner_name': row['winner_name'],
+        'winner_ai_type': row['winner_ai_type'],
+        'game_length': row['game_length'],
+        'player_name': row['player_name'],
+        'player_ai_type': row['player_ai_type'],
+        'average_score_per_turn': "{:.2f}".format(row['average_score_per_turn']),
+        'average_move_cost': "{:.2f}".format(row['average_move_cost']),
+    }
+
+
+def format_per_turn_row(row):
+    # Format the turn time
+    csv_row = dict(row)
+    turn_time = float(row['turn_time'])
+    if turn_time < 1:
+        csv_row['turn_time'] = "{:.2f}".format(turn_time)
+    else:
+        csv_row['turn_time'] = "{:.0f}".format(turn_time)
+    # Phase times are far below the turn time, keep them to the microsecond
+    for field in PHASE_FIELDS:
+        if field.endswith('_time') and field in row:
+            csv_row[field] = "{:.6f}".format(row[field])
+    return csv_row
+
+
+def merge_simulation_results(input_dirs, output_dir='.'):
+    # Combine the CSV files of the shards of a campaign into output_dir, ordered by game number
+    # The rows of a game keep their order, so the merged files only depend on the games, not on how they were split
+    os.makedirs(output_dir, exist_ok=True)
+    for file_name in ('simulations.csv', 'thinking_times.csv'):
+        header = None
+        rows = []
+        game_numbers = set()
+        for input_dir in input_dirs:
+            with open(os.path.join(input_dir, file_name), newline='') as input_file:
+                reader = csv.reader(input_file)
+                file_header = next(reader, None)
+                if file_header is None:
+                    continue
+                if header is not None and file_header != header:
+                    raise ValueError(f"{os.path.join(input_dir, file_name)} does not have the columns of the other shards")
+                header = file_header
+                game_number_column = header.index('game_number')
+                file_rows = list(reader)
+            file_game_numbers = {row[game_number_column] for row in file_rows}
+            if game_numbers & file_game_numbers:
+                raise ValueError(f"{os.path.join(input_dir, file_name)} repeats games of another shard")
+            game_numbers |= file_game_numbers
+            rows.extend(file_rows)
+        if header is None:
+            continue
+        rows.sort(key=lambda row: int(row[game_number_column]))  # Stable, a game's rows stay in order
+        with open(os.path.join(output_dir, file_name), 'w', newline='') as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(header)
+            writer.writerows(rows)
+    print(f"Merged {len(input_dirs)} result directories into {output_dir}.")
+
+
+def parse_shard(value):
+    # "i/N": the i-th of N shards, counted from 1
+    try:
+        shard_index, shard_count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like i/N, not {value!r}")
+    if not 1 <= shard_index <= shard_count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and {shard_count}")
+    return shard_index, shard_count
+
+
+def add_game_arguments(parser):
+    # The options that describe the games of a campaign, shared with the campaign coordinator
+    parser.add_argument('--players', type=int, default=4, choices=[1, 2, 3, 4])
+    parser.add_argument('--personalities', nargs='+', default=["Balanced"], choices=AI_PERSONALITIES,
+                        help="AI personality of each player, the last one is repeated for the remaining players")
+    parser.add_argument('--goal', type=int, default=10, help="Score that ends the game")
+    parser.add_argument('--depth', type=int, default=3, help="Search depth of every player")
+    parser.add_argument('--games', type=int, default=1, help="Number of games to simulate")
+    parser.add_argument('--seed', type=int, default=None, help="Seed the games to make the run reproducible")
+    parser.add_argument('--outdir', default='.', help="Directory of simulations.csv and thinking_times.csv")
+    parser.add_argument('--fsync-every', type=int, default=100, help="Sync the output files to disk every this many games")
+    parser.add_argument('--time-phases', action='store_true',
+                        help="Add the time and call count of every AI phase of a turn to thinking_times.csv")
+
+
+def get_player_settings(parser, args):
+    # AI personalities and search settings of every player from the parsed game options
+    if len(args.personalities) > args.players:
+        parser.error(f"{len(args.personalities)} personalities given for {args.players} players")
+    ai_personalities = args.personalities + [args.personalities[-1]] * (args.players - len(args.personalities))
+    search_settings = [{'search_depth': args.depth} for _ in range(args.players)]
+    return ai_personalities, search_settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Nova Luna AI simulations without the GUI")
+    add_game_arguments(parser)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes, by default one per core up to 10")
+    parser.add_argument('--shard', type=parse_shard, default=(1, 1),
+                        help="i/N: play only every N-th game starting with game i, run all N shards with the same --seed")
+    parser.add_argument('--merge', nargs='+', metavar='DIR',
+                        help="Merge the results of these shard output directories into --outdir instead of simulating")
+    parser.add_argument('--trace-dir', default=None,
+                        help="Write the event trace of every game to game<number>.trace in this directory")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.merge:
+        merge_simulation_results(args.merge, args.outdir)
+        return
+    ai_personalities, search_settings = get_player_settings(parser, args)
+    run_simulations(
+        args.games, args.players, args.goal, ai_personalities, search_settings,
+        max_workers=args.workers, seed=args.seed, output_dir=args.outdir, fsync_every=args.fsync_every,
+        shard=args.shard, time_phases=args.time_phases, trace_dir=args.trace_dir
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import random
+import struct
+
+from card_generator import CARD_CATALOG
+from game import Game, TurnOrder, new_statistics
+from Player import Player
+
+# Compact, versioned binary snapshot of the state of a Game that affects play, for sending positions between processes
+# Game.to_bytes() / Game.from_bytes(data) use it. All numbers are little endian, version 2 holds:
+#   header       b'NLS' and the format version
+#   game         goal, turn number, game number, current player, moon marker slot, flags, inventory engine
+#   tokens       completed_token_mask as length-prefixed bytes
+#   rng          the Mersenne Twister state of game.rng, so the deals of the searched moves stay the same
+#   card board   one byte per slot: card id, EMPTY_SLOT or MOON_MARKER_SLOT
+#   deck         card ids in deck order
+#   players      name, color, personality, scores, movement, search settings, inventory as (x, y, card id) entries
+#                strings are length-prefixed, a length of NO_STRING stands for None (the personality of a human seat)
+#   track        player indices of every space, bottom of the stack first
+#   histories    TurnOrder.get_history() and last_positions as player indices
+# Left out: the GUI, the worker pool, statistics, the phase timer, the event trace, the Zobrist hash and the undo
+# histories of the inventories, a restored game can only take back moves made after it was restored
+
+MAGIC = b'NLS'
+VERSION = 2
+EMPTY_SLOT = 255
+MOON_MARKER_SLOT = 254
+NO_STRING = 255
+
+FLAG_SIMULATION_MODE = 1
+FLAG_IN_SIMULATION = 2
+FLAG_SINGLE_SIMULATION = 4
+FLAG_GAME_OVER = 8
+
+GAME_FORMAT = struct.Struct('<HIIBBBB')
+RNG_FORMAT = struct.Struct('<625I?d')
+PLAYER_FORMAT = struct.Struct('<?hhhhdB?d?QH')
+INVENTORY_CARD_FORMAT = struct.Struct('<hhB')
+
+
+class SnapshotReader:
+    # Reads the fields of a snapshot in order
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def read(self, struct_format):
+        values = struct_format.unpack_from(self.data, self.offset)
+        self.offset += struct_format.size
+        return values
+
+    def read_bytes(self, length):
+        value = bytes(self.data[self.offset:self.offset + length])
+        self.offset += length
+        return value
+
+    def read_byte(self):
+        value = self.data[self.offset]
+        self.offset += 1
+        return value
+
+    def read_byte_list(self):
+        length = self.read(struct.Struct('<I'))[0]
+        return list(self.read_bytes(length))
+
+    def read_string(self):
+        length = self.read_byte()
+        if length == NO_STRING:
+            return None
+        return self.read_bytes(length).decode()
+
+
+def pack_string(value):
+    if value is None:
+        return bytes([NO_STRING])
+    encoded = value.encode()
+    if len(encoded) >= NO_STRING:
+        raise ValueError(f"{value!r} is too long to snapshot")
+    return bytes([len(encoded)]) + encoded
+
+
+def pack_byte_list(values):
+    return struct.pack('<I', len(values)) + bytes(values)
+
+
+def get_card_id(card):
+    if card.card_id is None:
+        raise ValueError(f"{card} is not a card_generator.CARD_CATALOG card and has no id to snapshot")
+    return card.card_id
+
+
+def game_to_bytes(game):
+    player_indices = {player.name: index for index, player in enumerate(game.players)}
+    flags = (
+        (FLAG_SIMULATION_MODE if game.simulation_mode else 0)
+        | (FLAG_IN_SIMULATION if game.in_simulation else 0)
+        | (FLAG_SINGLE_SIMULATION if game.is_single_simulation else 0)
+        | (FLAG_GAME_OVER if game.game_over else 0)
+    )
+    parts = [
+        MAGIC, bytes([VERSION]),
+        GAME_FORMAT.pack(
+            game.goal, game.turn_number, game.game_number, game.current_player_index, game.moon_marker_position,
+            flags, len(game.players)
+        ),
+        pack_string(game.inventory_engine),
+    ]
+
+    completed_tokens = game.completed_token_mask.to_bytes((game.completed_token_mask.bit_length() + 7) // 8, 'little')
+    parts.append(struct.pack('<H', len(completed_tokens)) + completed_tokens)
+
+    _, internal_state, gauss_next = game.rng.getstate()
+    parts.append(RNG_FORMAT.pack(*internal_state, gauss_next is not None, gauss_next or 0.0))
+
+    card_board = []
+    for card in game.card_board:
+        if card is None:
+            card_board.append(EMPTY_SLOT)
+        elif card == game.moon_marker:
+            card_board.append(MOON_MARKER_SLOT)
+        else:
+            card_board.append(get_card_id(card))
+    parts.append(pack_byte_list(card_board))
+    parts.append(pack_byte_list([get_card_id(card) for card in game.deck]))
+
+    for player in game.players:
+        parts.append(pack_string(player.name) + pack_string(player.color) + pack_string(player.ai_personality))
+        cards = player.inventory.get_all_cards()
+        parts.append(PLAYER_FORMAT.pack(
+            player.is_ai, player.score, player.total_movement, player.score_at_turn_start,
+            player.total_movement_at_turn_start, player.token_progress_since_turn_start, player.search_depth,
+            player.time_budget is not None, player.time_budget or 0.0,
+            player.max_nodes is not None, player.max_nodes or 0,
+            len(cards)
+        ))
+        parts.extend(INVENTORY_CARD_FORMAT.pack(x, y, get_card_id(card)) for card, x, y in cards)
+
+    parts.append(bytes([len(game.board)]))
+    for space in game.board:
+        parts.append(bytes([len(space)] + [player_indices[player.name] for player in space]))
+
+    parts.append(pack_byte_list([player_indices[name] for name in game.turn_order.get_history()]))
+    last_positions = []
+    for name, position in game.last_positions:
+        last_positions += [player_indices[name], position]
+    parts.append(pack_byte_list(last_positions))
+    return b''.join(parts)
+
+
+def game_from_bytes(data):
+    reader = SnapshotReader(data)
+    if reader.read_bytes(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a game snapshot")
+    version = reader.read_byte()
+    if version != VERSION:
+        raise ValueError(f"Game snapshot version {version} is not supported, expected {VERSION}")
+
+    game = Game.__new__(Game)
+    (game.goal, game.turn_number, game.game_number, game.current_player_index, game.moon_marker_position,
+     flags, num_players) = reader.read(GAME_FORMAT)
+    game.simulation_mode = bool(flags & FLAG_SIMULATION_MODE)
+    game.in_simulation = bool(flags & FLAG_IN_SIMULATION)
+    game.is_single_simulation = bool(flags & FLAG_SINGLE_SIMULATION)
+    game.game_over = bool(flags & FLAG_GAME_OVER)
+    game.inventory_engine = reader.read_string()
+
+    completed_tokens_length = reader.read(struct.Struct('<H'))[0]
+    game.completed_token_mask = int.from_bytes(reader.read_bytes(completed_tokens_length), 'little')
+
+    *internal_state, has_gauss_next, gauss_next = reader.read(RNG_FORMAT)
+    game.rng = random.Random()
+    game.rng.setstate((3, tuple(internal_state), gauss_next if has_gauss_next else None))
+
+    game.moon_marker = "moon_marker"
+    game.card_board = []
+    for slot in reader.read_byte_list():
+        if slot == EMPTY_SLOT:
+            game.card_board.append(None)
+        elif slot == MOON_MARKER_SLOT:
+            game.card_board.append(game.moon_marker)
+        else:
+            game.card_board.append(CARD_CATALOG[slot])
+    game.deck = [CARD_CATALOG[card_id] for card_id in reader.read_byte_list()]
+
+    game.players = []
+    for _ in range(num_players):
+        name = reader.read_string()
+        color = reader.read_string()
+        ai_personality = reader.read_string()
+        (is_ai, score, total_movement, score_at_turn_start, total_movement_at_turn_start,
+         token_progress_since_turn_start, search_depth, has_time_budget, time_budget, has_max_nodes, max_nodes,
+         num_cards) = reader.read(PLAYER_FORMAT)
+        player = Player(
+            color, name, score=score, is_ai=is_ai, ai_personality=ai_personality, search_depth=search_depth,
+            time_budget=time_budget if has_time_budget else None, max_nodes=max_nodes if has_max_nodes else None,
+            inventory_engine=game.inventory_engine
+        )
+        player.total_movement = total_movement
+        player.score_at_turn_start = score_at_turn_start
+        player.total_movement_at_turn_start = total_movement_at_turn_start
+        player.token_progress_since_turn_start = token_progress_since_turn_start
+        for _ in range(num_cards):
+            x, y, card_id = reader.read(INVENTORY_CARD_FORMAT)
+            player.inventory.add_card(CARD_CATALOG[card_id], x, y)
+        game.players.append(player)
+
+    game.board = []
+    game.player_positions = {}
+    for position in range(reader.read_byte()):
+        space = [game.players[reader.read_byte()] for _ in range(reader.read_byte())]
+        for player in space:
+            game.player_positions[player.name] = position
+        game.board.append(space)
+
+    game.turn_order = TurnOrder(game.players[index].name for index in reader.read_byte_list())
+    last_positions = reader.read_byte_list()
+    game.last_positions = []
+    for i in range(0, len(last_positions), 2):
+        name = game.players[last_positions[i]].name
+        game.last_positions = [entry for entry in game.last_positions if entry[0] != name]
+        game.last_positions.append((name, last_positions[i + 1]))
+    game.count_end_game_state()
+
+    game.card_move_costs = {player.name: 0 for player in game.players}
+    game.gui = None
+    game.ai_pool = None
+    game.zobrist_hash = None
+    game.phase_timer = None
+    game.event_trace = None
+    game.statistics = new_statistics(game.players)
+    return game
@@ -0,0 +1,228 @@
+import argparse
+import csv
+import itertools
+import logging
+import math
+import os
+import queue
+import random
+from multiprocessing import Pool, active_children, cpu_count
+
+from simulation import AI_PERSONALITIES, run_single_simulation
+
+# Round-robin tournament of AI personalities in two-player games, e.g.:
+#   python -m tournament --personalities Balanced Power Combo Greedy --seed 7 --outdir tournament
+# Every deal is played twice, once with each personality in the first seat, since ties go to the first seat.
+# A pairing stops as soon as its sequential probability ratio test (SPRT) decides which personality is stronger,
+# or after --max-games games when they are too close to tell apart at the requested --delta.
+
+TOURNAMENT_FIELDS = ['deal', 'player1_ai_type', 'player2_ai_type', 'winner_ai_type', 'game_length', 'counted']
+RESULT_CHECK_INTERVAL = 5  # Seconds without a finished game after which the worker processes are checked
+
+
+class PairingTest:
+    # SPRT of one pairing on the results of both seatings of every deal
+    # p is the chance that the first personality wins a game. H0: p = 0.5 - delta (the second personality is
+    # stronger) against H1: p = 0.5 + delta (the first one is), with error rates alpha and beta.
+
+    def __init__(self, first, second, delta=0.1, alpha=0.05, beta=0.05, max_games=200):
+        self.first = first
+        self.second = second
+        self.max_games = max_games
+        self.win_step = math.log((0.5 + delta) / (0.5 - delta))  # Log likelihood ratio of one win of first
+        self.upper_bound = math.log((1 - beta) / alpha)
+        self.lower_bound = math.log(beta / (1 - alpha))
+        self.wins = {first: 0, second: 0}
+        self.log_likelihood_ratio = 0.0
+        self.decision = None  # The stronger personality, 'even' after max_games without a decision
+        self.next_deal = 1
+        self.deal_winners = {}  # Deal -> winners of its games so far, a deal counts once both seatings are in
+
+    @property
+    def games(self):
+        return self.wins[self.first] + self.wins[self.second]
+
+    def is_scheduling(self):
+        # Whether the pairing still needs more deals, the ones already playing are counted as games to come
+        return self.decision is None and (self.next_deal - 1) * 2 < self.max_games
+
+    def take_deal(self):
+        deal = self.next_deal
+        self.next_deal += 1
+        return deal
+
+    def add_game(self, deal, winner_ai_type):
+        # Returns whether the game counts for the test, games that finish after the decision do not
+        if self.decision is not None:
+            return False
+        winners = self.deal_winners.setdefault(deal, [])
+        winners.append(winner_ai_type)
+        if len(winners) == 2:
+            del self.deal_winners[deal]
+            for winner in winners:
+                self.wins[winner] += 1
+                self.log_likelihood_ratio += self.win_step if winner == self.first else -self.win_step
+            if self.log_likelihood_ratio >= self.upper_bound:
+                self.decision = self.first
+            elif self.log_likelihood_ratio <= self.lower_bound:
+                self.decision = self.second
+            elif self.games >= self.max_games:
+                self.decision = 'even'
+        return True
+
+    def get_status(self):
+        low, high = get_wilson_interval(self.wins[self.first], self.games)
+        status = f"{self.decision} stronger" if self.decision not in (None, 'even') else self.decision or 'running'
+        return (
+            f"{self.first} vs {self.second}: {self.wins[self.first]}-{self.wins[self.second]}, "
+            f"{self.first} win rate {get_win_rate(self.wins[self.first], self.games):.0%} "
+            f"[{low:.0%}, {high:.0%}], LLR {self.log_likelihood_ratio:.2f} "
+            f"({self.lower_bound:.2f}, {self.upper_bound:.2f}), {status}"
+        )
+
+
+def get_win_rate(wins, games):
+    return wins / games if games else 0.5
+
+
+def get_wilson_interval(wins, games, z=1.96):
+    # 95% confidence interval of a win rate, also sensible for few games and rates near 0 or 1
+    if games == 0:
+        return 0.0, 1.0
+    rate = wins / games
+    center = (rate + z * z / (2 * games)) / (1 + z * z / games)
+    margin = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def play_tournament_game(game_args):
+    # One game of a pairing in a worker process, returns the winner and the length of the game
+    deal, ai_personalities, goal, search_depth, seed = game_args
+    search_settings = [{'search_depth': search_depth} for _ in ai_personalities]
+    player_data, _ = run_single_simulation(deal, 2, goal, ai_personalities, False, search_settings, seed)
+    return player_data[0]['winner_ai_type'], player_data[0]['game_length']
+
+
+def get_worker_pids():
+    # The pool's worker processes, the only children of the tournament process
+    return {process.pid for process in active_children()}
+
+
+def run_tournament(personalities, goal=10, search_depth=3, delta=0.1, alpha=0.05, beta=0.05, max_games=200, max_workers=None, seed=None, output_dir='.'):
+    # Play the pairings until every one is decided, returns the PairingTests
+    # Deals are handed out round-robin over the pairings still running, so they all advance at the same pace
+    # and a decided pairing frees its workers for the others. Every game is written to tournament.csv.
+    # A game that raises stops the tournament with its exception. So does a worker process that dies, the pool
+    # replaces it but the game it was playing would never finish.
+    max_workers = max_workers or min(cpu_count(), 10)
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+        print(f"Tournament seed {seed}, pass --seed {seed} to play these games again")
+    pairings = [
+        PairingTest(first, second, delta, alpha, beta, max_games)
+        for first, second in itertools.combinations(personalities, 2)
+    ]
+    os.makedirs(output_dir, exist_ok=True)
+    finished_games = queue.Queue()
+    in_flight = 0
+    with open(os.path.join(output_dir, 'tournament.csv'), 'w', newline='') as output_file, \
+            Pool(processes=max_workers) as pool:
+        writer = csv.DictWriter(output_file, fieldnames=TOURNAMENT_FIELDS)
+        writer.writeheader()
+        schedule = itertools.cycle(pairings)
+        worker_pids = get_worker_pids()
+        while True:
+            # Keep every worker busy with both seatings of the next deal of a running pairing
+            while in_flight < 2 * max_workers and any(pairing.is_scheduling() for pairing in pairings):
+                pairing = next(schedule)
+                if not pairing.is_scheduling():
+                    continue
+                deal = pairing.take_deal()
+                for seating in ((pairing.first, pairing.second), (pairing.second, pairing.first)):
+                    pool.apply_async(
+                        play_tournament_game, ((deal, list(seating), goal, search_depth, seed),),
+                        callback=lambda result, pairing=pairing, deal=deal, seating=seating:
+                            finished_games.put((pairing, deal, seating, result)),
+                        error_callback=lambda error: finished_games.put(error)
+                    )
+                    in_flight += 1
+            if in_flight == 0:
+                break
+            try:
+                finished_game = finished_games.get(timeout=RESULT_CHECK_INTERVAL)
+            except queue.Empty:
+                current_worker_pids = get_worker_pids()
+                if worker_pids - current_worker_pids:
+                    raise RuntimeError(f"A tournament worker process died, {in_flight} games will never finish")
+                worker_pids = current_worker_pids
+                continue
+            if isinstance(finished_game, BaseException):
+                raise finished_game
+            in_flight -= 1
+            pairing, deal, seating, (winner_ai_type, game_length) = finished_game
+            counted = pairing.add_game(deal, winner_ai_type)
+            writer.writerow({
+                'deal': deal,
+                'player1_ai_type': seating[0],
+                'player2_ai_type': seating[1],
+                'winner_ai_type': winner_ai_type,
+                'game_length': game_length,
+                'counted': counted,
+            })
+            output_file.flush()
+            if counted and deal not in pairing.deal_winners:  # Both seatings of the deal are in
+                print(pairing.get_status())
+
+    print_rankings(personalities, pairings)
+    print(f"Tournament complete. Games saved to tournament.csv in {output_dir}.")
+    return pairings
+
+
+def print_rankings(personalities, pairings):
+    # Personalities by their win rate over the counted games of all their pairings
+    wins = dict.fromkeys(personalities, 0)
+    games = dict.fromkeys(personalities, 0)
+    for pairing in pairings:
+        for personality in (pairing.first, pairing.second):
+            wins[personality] += pairing.wins[personality]
+            games[personality] += pairing.games
+    print(f"{'rank':>4} {'personality':<12} {'games':>6} {'win rate':>9} {'95% interval':>14}")
+    ranking = sorted(personalities, key=lambda personality: get_win_rate(wins[personality], games[personality]), reverse=True)
+    for rank, personality in enumerate(ranking, 1):
+        low, high = get_wilson_interval(wins[personality], games[personality])
+        print(f"{rank:>4} {personality:<12} {games[personality]:>6} "
+              f"{get_win_rate(wins[personality], games[personality]):>9.1%} {f'[{low:.1%}, {high:.1%}]':>14}")
+    for pairing in pairings:
+        print(pairing.get_status())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank Nova Luna AI personalities in a round-robin tournament")
+    parser.add_argument('--personalities', nargs='+', default=["Balanced", "Power", "Combo", "Greedy"],
+                        choices=AI_PERSONALITIES, help="Personalities that play each other")
+    parser.add_argument('--goal', type=int, default=10, help="Score that ends the game")
+    parser.add_argument('--depth', type=int, default=3, help="Search depth of every player")
+    parser.add_argument('--delta', type=float, default=0.1,
+                        help="Win rate difference from 50%% the test tells apart, 0.1 is 60%% against 40%%")
+    parser.add_argument('--alpha', type=float, default=0.05,
+                        help="Chance of ranking the first personality of a pairing higher when it is the weaker one")
+    parser.add_argument('--beta', type=float, default=0.05,
+                        help="Chance of ranking the second personality of a pairing higher when it is the weaker one")
+    parser.add_argument('--max-games', type=int, default=200, help="Games after which an undecided pairing is even")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes, by default one per core up to 10")
+    parser.add_argument('--seed', type=int, default=None, help="Seed the deals to make the tournament reproducible")
+    parser.add_argument('--outdir', default='.', help="Directory of tournament.csv")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+    if len(set(args.personalities)) != len(args.personalities) or len(args.personalities) < 2:
+        parser.error("give at least two different personalities")
+    if not 0 < args.delta < 0.5:
+        parser.error("delta must be between 0 and 0.5")
+    run_tournament(
+        args.personalities, args.goal, args.depth, args.delta, args.alpha, args.beta, args.max_games,
+        max_workers=args.workers, seed=args.seed, output_dir=args.outdir
+    )
+
+
+if __name__ == "__main__":
+    main()
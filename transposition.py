@@ -0,0 +1,137 @@
+import random
+
+# Zobrist hashing of the game state and a bounded transposition table for the maxn search
+
+# The keys come from their own generator so hashing never touches the game's random state
+_zobrist_random = random.Random(0x4E6F7661)
+_zobrist_keys = {}
+
+_card_signatures = {}
+
+EMPTY_SLOT = 'empty'
+MOON_MARKER_SLOT = 'moon_marker'
+
+
+def zobrist_key(*feature):
+    # Returns the random 64 bit key of a state feature, keys are created on first use
+    key = _zobrist_keys.get(feature)
+    if key is None:
+        key = _zobrist_random.getrandbits(64)
+        _zobrist_keys[feature] = key
+    return key
+
+
+def card_signature(card):
+    # Identical cards (e.g. the two 2 cost cards of a color) hash the same, so swapping them is a transposition
+    signature = _card_signatures.get(card.card_id)
+    if signature is None:
+        tokens = tuple((token.red, token.green, token.blue, token.yellow) for token in card.tokens)
+        signature = (card.color, card.movement, tokens)
+        _card_signatures[card.card_id] = signature
+    return signature
+
+
+def card_board_slot_key(game, slot, card):
+    if card is None:
+        return zobrist_key('card_board', slot, EMPTY_SLOT)
+    if card == game.moon_marker:
+        return zobrist_key('card_board', slot, MOON_MARKER_SLOT)
+    return zobrist_key('card_board', slot, card_signature(card))
+
+
+def compute_zobrist_hash(game):
+    # Hash the whole game state from scratch, do_move/undo_move keep it up to date afterwards
+    zobrist_hash = zobrist_key('moon_marker_position', game.moon_marker_position)
+    for slot, card in enumerate(game.card_board):
+        zobrist_hash ^= card_board_slot_key(game, slot, card)
+    for player_index, player in enumerate(game.players):
+        zobrist_hash ^= zobrist_key('player_position', player_index, game.player_positions[player.name])
+        zobrist_hash ^= zobrist_key('total_movement', player_index, player.total_movement)
+        for (x, y), card in player.inventory.grid.items():
+            zobrist_hash ^= zobrist_key('inventory', player_index, card_signature(card), x, y)
+            for token_index in range(len(card.tokens)):
+                if game.is_token_completed(card, token_index):
+                    zobrist_hash ^= zobrist_key('token_completed', player_index, x, y, token_index)
+    return zobrist_hash
+
+
+def zobrist_move_delta(game, undo_record):
+    # Returns the value to XOR into the hash for a move just made by game.do_move
+    player = undo_record['player']
+    player_index = game.players.index(player)
+    card = undo_record['card']
+    x, y = undo_record['position']
+
+    delta = zobrist_key('inventory', player_index, card_signature(card), x, y)
+
+    old_card_board = undo_record['card_board']
+    for slot, card_on_slot in enumerate(game.card_board):
+        if card_on_slot is not old_card_board[slot]:
+            delta ^= card_board_slot_key(game, slot, old_card_board[slot])
+            delta ^= card_board_slot_key(game, slot, card_on_slot)
+    if game.moon_marker_position != undo_record['moon_marker_position']:
+        delta ^= zobrist_key('moon_marker_position', undo_record['moon_marker_position'])
+        delta ^= zobrist_key('moon_marker_position', game.moon_marker_position)
+
+    if undo_record['moved_from'] is not None:
+        old_position, _ = undo_record['moved_from']
+        delta ^= zobrist_key('player_position', player_index, old_position)
+        delta ^= zobrist_key('player_position', player_index, game.player_positions[player.name])
+        delta ^= zobrist_key('total_movement', player_index, player.total_movement - card.movement)
+        delta ^= zobrist_key('total_movement', player_index, player.total_movement)
+
+    for _, token_index, card_x, card_y in undo_record['completed_tokens']:
+        delta ^= zobrist_key('token_completed', player_index, card_x, card_y, token_index)
+    return delta
+
+
+class TranspositionTable:
+    # Fixed size table of maxn value vectors, keyed by the Zobrist hash of the searched position
+    # A slot keeps the entry searched to the greater depth when two positions compete for it
+    # The slots are only allocated by the first store, a search with a node budget gets no more slots than nodes
+
+    def __init__(self, max_entries=1 << 18, max_nodes=None):
+        if max_nodes is not None:
+            max_entries = min(max_entries, 1 << max(max_nodes - 1, 1).bit_length())
+        self.max_entries = max_entries
+        self.entries = None
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def position_key(self, game, current_player):
+        # The side to move and the simulation flag change the value of a position too
+        position_key = game.zobrist_hash ^ zobrist_key('to_move', current_player.name)
+        if game.in_simulation:
+            position_key ^= zobrist_key('in_simulation')
+        return position_key
+
+    def lookup(self, position_key, depth):
+        # Returns the stored values of a position searched to exactly this depth, or None
+        entry = self.entries[position_key % self.max_entries] if self.entries is not None else None
+        if entry is not None:
+            stored_key, stored_depth, values = entry
+            if stored_key == position_key:
+                if stored_depth == depth:
+                    self.hits += 1
+                    return values
+            else:
+                self.collisions += 1
+        self.misses += 1
+        return None
+
+    def store(self, position_key, depth, values):
+        if self.entries is None:
+            self.entries = [None] * self.max_entries
+        slot = position_key % self.max_entries
+        entry = self.entries[slot]
+        if entry is None or depth >= entry[1]:
+            self.entries[slot] = (position_key, depth, values)
+
+    def get_statistics(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'entries': sum(1 for entry in self.entries or () if entry is not None),
+        }